@@ -0,0 +1,159 @@
+# Timing benchmarks for the headless reading core: tokenization, text
+# filters, per-word timing weights, chunk layout, frame generation per
+# reading mode and stats journaling, on the bundled books.
+# Each run is appended to benchmarks/history.jsonl and compared with the
+# previous run so regressions show up over time.
+#
+#   python benchmarks/bench_engine.py [--repeat N] [--threshold 0.1] [--strict]
+import argparse
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from chunking import MEASURED_CHARS, TextWidths, chunk_starts
+from rsvp import RSVPEngine, display_text, session_record
+from stats_store import StatsStore
+from text_filters import DEFAULT_FILTERS, filter_book
+from timing import cumulative_weights, load_wordlist
+from tokens import TokenSource
+
+BOOKS = sorted(glob.glob(os.path.join(ROOT, "data", "books", "*.txt")))
+HISTORY_PATH = os.path.join(ROOT, "benchmarks", "history.jsonl")
+WORDLIST_PATH = os.path.join(ROOT, "data", "wordlists", "common_en.txt")
+# Stand-in character widths for chunk layout, as a proportional font at 42px
+CHAR_WIDTHS = {char: 12 if char in "fijlrt.,;:'!| " else 30 if char in "mwMW" else 22 for char in MEASURED_CHARS}
+
+
+def load(path):
+    tokens = TokenSource(path)
+    tokens.wait()
+    return tokens
+
+
+def bench_tokenize(path):
+    return lambda: load(path).close()
+
+
+def bench_filters(path):
+    tokens = load(path)
+    return lambda: filter_book(tokens, DEFAULT_FILTERS, io.BytesIO())
+
+
+def bench_timing(path):
+    tokens = load(path)
+    common_words = load_wordlist(WORDLIST_PATH)
+    return lambda: cumulative_weights(tokens, common_words)
+
+
+def bench_frames(path, mode):
+    tokens = load(path)
+    engine = RSVPEngine(tokens, mode)
+    engine.compute_timing()
+    if mode == "chunk":
+        engine.chunk_key = ("bench", 42)
+        engine.compute_chunks(tokens, engine.chunk_key, CHAR_WIDTHS)
+
+    def run():
+        for frame in engine.frames():
+            display_text(frame.text, "focus", 42)
+    return run
+
+
+def bench_chunks(path):
+    tokens = load(path)
+    return lambda: chunk_starts(tokens, TextWidths(CHAR_WIDTHS))
+
+
+def bench_stats(records=20000):
+    def run():
+        with tempfile.TemporaryDirectory() as stats_dir:
+            store = StatsStore(stats_dir)
+            store.load()
+            for _ in range(records):
+                store.record(session_record(1, 0.1 / 60, "bench"))
+            store.flush()
+    return run
+
+
+def benchmarks():
+    for path in BOOKS:
+        name = os.path.splitext(os.path.basename(path))[0][:24]
+        yield f"tokenize[{name}]", bench_tokenize(path)
+        yield f"filters[{name}]", bench_filters(path)
+        yield f"timing[{name}]", bench_timing(path)
+        yield f"chunks[{name}]", bench_chunks(path)
+        for mode in ("word", "chunk", "sentence", "paragraph"):
+            yield f"frames.{mode}[{name}]", bench_frames(path, mode)
+    yield "stats.record[20000]", bench_stats()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def last_run():
+    try:
+        with open(HISTORY_PATH, "r") as f:
+            lines = f.read().splitlines()
+        return json.loads(lines[-1])["results"] if lines else {}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the headless reading core")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression")
+    parser.add_argument("--strict", action="store_true", help="Exit non-zero on regressions")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    args = parser.parse_args()
+
+    previous = last_run()
+    results = {}
+    regressions = []
+    print(f"{'benchmark':44} {'best':>10} {'previous':>10} {'change':>8}")
+    for name, run in benchmarks():
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        results[name] = best
+        change = ""
+        before = previous.get(name)
+        if before:
+            ratio = best / before - 1
+            change = f"{ratio:+.1%}"
+            if ratio > args.threshold:
+                regressions.append(name)
+                change += " !"
+        before_text = f"{before * 1000:.2f}ms" if before else "-"
+        print(f"{name:44} {best * 1000:>8.2f}ms {before_text:>10} {change:>8}")
+
+    if not args.no_save:
+        with open(HISTORY_PATH, "a") as f:
+            f.write(json.dumps({
+                "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "revision": git_revision(),
+                "python": sys.version.split()[0],
+                "results": results
+            }) + "\n")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Scaling of parallel tokenization: builds a large text from the bundled
+# books and times a full index build with 1, 2, 4 and 8 worker processes,
+# reporting throughput and speedup over one worker. Every parallel index is
+# checked against the single-threaded one.
+#
+#   python benchmarks/bench_parallel.py [--size-mb 256] [--workers 1 2 4 8]
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from tokens import TokenSource
+
+BOOKS = sorted(glob.glob(os.path.join(ROOT, "data", "books", "*.txt")))
+
+
+def build_text(path, size):
+    sample = b"\n\n".join(open(book, "rb").read() for book in BOOKS) + b"\n\n"
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            f.write(sample)
+            written += len(sample)
+    return os.path.getsize(path)
+
+
+def index(path, workers):
+    started = time.perf_counter()
+    tokens = TokenSource(path, workers=workers, parallel_min_bytes=0)
+    tokens.wait()
+    return tokens, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel tokenization")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.txt")
+        size = build_text(path, args.size_mb << 20)
+        print(f"{size / (1 << 20):.0f} MB text, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {'MB/s':>8} {'speedup':>8}")
+        reference, baseline = index(path, 1)
+        expected = [a.tobytes() for a in reference.arrays()]
+        reference.close()
+        for workers in args.workers:
+            if workers == 1:
+                elapsed = baseline
+            else:
+                tokens, elapsed = index(path, workers)
+                if [a.tobytes() for a in tokens.arrays()] != expected:
+                    print(f"{workers} workers produced a different index")
+                    sys.exit(1)
+                tokens.close()
+            print(f"{workers:>8} {elapsed:>9.2f} {size / (1 << 20) / elapsed:>8.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Tokenizer throughput in MB/s and segmentation quality.
+#
+# Throughput: whitespace tokenization of the bundled English books, the same
+# books with typographic dashes and quotes (Unicode word breaking), and
+# Chinese and Japanese text (dictionary and phrase segmentation). There is
+# no CJK book in the repository, so Chinese text of the requested size is
+# generated from the word list, weighted by word counts, and Japanese text
+# repeats the sentences below.
+#
+# Quality: real sentences, segmented by hand, are split by the segmenters
+# and scored by the F1 of the word spans found. Chinese is segmented into
+# words and Japanese into phrases (a word with its particles and endings),
+# as the segmenters aim to; punctuation belongs to the word it follows.
+#
+#   python benchmarks/bench_segment.py [--size-mb 16] [--repeat 3]
+import argparse
+import glob
+import itertools
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from segmenters import CHINESE_WORDLIST, get_segmenter
+from tokens import TokenSource
+
+BOOKS = sorted(glob.glob(os.path.join(ROOT, "data", "books", "*.txt")))
+CHINESE_SENTENCES = """
+我 在 北京大学 学习。
+今天 天气 很 好， 我们 去 公园 散步 吧。
+他 是 非常 优秀 的 医生。
+中国 的 经济 发展 很 快。
+这 本 书 非常 有意思。
+我们 应该 保护 环境。
+请 你 明天 早上 来 我 的 办公室。
+科学家 发现 了 新 的 治疗 方法。
+孩子们 在 学校 里 学习 数学 和 语文。
+政府 正在 研究 新 的 交通 政策。
+图书馆 里 有 很多 中文 书。
+我 的 朋友 住 在 上海。
+这个 问题 需要 认真 考虑。
+经济 全球化 对 发展中国家 影响 很 大。
+他们 昨天 参观 了 博物馆。
+她 喜欢 在 周末 看 电影。
+医生 建议 他 多 喝 水。
+人工智能 正在 改变 世界。
+他 每天 坚持 锻炼 身体。
+我们 需要 更多 的 时间。
+老师 给 学生 布置 了 作业。
+长江 是 中国 最 长 的 河流。
+她 打算 明年 出国 留学。
+""".split("\n")[1:-1]
+JAPANESE_SENTENCES = """
+私は 東京に 住んでいます。
+今日は とても 暑いですね。
+日本語を 勉強しています。
+駅まで 歩いて 行きます。
+この 本は 図書館で 借りました。
+明日は 雨が 降るでしょう。
+彼は 大学で 経済を 専攻している。
+コンピューターの 使い方を 教えてください。
+新しい スマートフォンを 買いました。
+子供たちが 公園で 遊んでいる。
+会議は 午後三時に 始まります。
+電車が 遅れています。
+窓を 開けても いいですか。
+父は 毎朝 新聞を 読みます。
+この 料理は とても おいしい。
+""".split("\n")[1:-1]
+
+
+def english_text(size, typographic=False):
+    sample = b"\n\n".join(open(book, "rb").read() for book in BOOKS) + b"\n\n"
+    if typographic:
+        sample = sample.decode("utf-8", errors="replace").replace("--", "—").replace(" '", " ‘")
+        sample = sample.replace("'", "’").encode("utf-8")
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def chinese_text(size):
+    words, counts = [], []
+    with open(CHINESE_WORDLIST, "r", encoding="utf-8") as f:
+        for line in f:
+            word, count = line.split()
+            words.append(word)
+            counts.append(int(count))
+    cumulative = list(itertools.accumulate(counts))
+    rng = random.Random(0)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = ["".join(rng.choices(words, cum_weights=cumulative, k=rng.randint(6, 20))) +
+                     rng.choice("。。。！？")
+                     for _ in range(rng.randint(2, 6))]
+        paragraph = "，".join(sentences).encode("utf-8")
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return b"\n\n".join(paragraphs)
+
+
+def japanese_text(size):
+    sentences = ["".join(sentence.split()) for sentence in JAPANESE_SENTENCES]
+    rng = random.Random(0)
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = "".join(rng.choices(sentences, k=rng.randint(2, 8))).encode("utf-8")
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return b"\n\n".join(paragraphs)
+
+
+def throughput(data, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        tokens = TokenSource.from_bytes(data)
+        tokens.wait()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return tokens, best
+
+
+def quality(segmenter, sentences):
+    # F1 of the (start, end) word spans against the hand segmentation, and
+    # the sentences segmented differently
+    found = expected = correct = 0
+    mistakes = []
+    for sentence in sentences:
+        words = sentence.split()
+        text = "".join(words)
+        gold = set()
+        position = 0
+        for word in words:
+            gold.add((position, position + len(word)))
+            position += len(word)
+        spans = {(first, last) for first, last in segmenter.split(text)}
+        found += len(spans)
+        expected += len(gold)
+        correct += len(spans & gold)
+        if spans != gold:
+            mistakes.append(" ".join(text[first:last] for first, last in sorted(spans)))
+    precision = correct / found if found else 0
+    recall = correct / expected if expected else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+    return f1, mistakes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tokenizer throughput and segmentation quality")
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size_mb << 20
+    print(f"{'text':>12} {'segmenter':>10} {'MB':>6} {'words':>10} {'seconds':>8} {'MB/s':>7}")
+    for name, data in (("english", english_text(size)), ("typographic", english_text(size, True)),
+                       ("chinese", chinese_text(size)), ("japanese", japanese_text(size))):
+        tokens, elapsed = throughput(data, args.repeat)
+        mb = len(data) / (1 << 20)
+        print(f"{name:>12} {tokens.segmenter or 'spaces':>10} {mb:>6.1f} {len(tokens):>10} "
+              f"{elapsed:>8.2f} {mb / elapsed:>7.1f}")
+
+    print()
+    for name, segmenter, sentences in (("chinese", "zh", CHINESE_SENTENCES),
+                                       ("japanese", "ja", JAPANESE_SENTENCES)):
+        f1, mistakes = quality(get_segmenter(segmenter), sentences)
+        print(f"{name}: F1 {f1:.3f} over {len(sentences)} sentences, {len(mistakes)} segmented differently")
+        for mistake in mistakes:
+            print(f"    {mistake}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Compares the memory held by a loaded book as a list of str (the old
+# f.read().split() path) against the array-backed TokenSource. The text
+# buffer of a TokenSource is memory-mapped from the file, so it is paged in
+# by the OS rather than allocated on the Python heap and is not counted.
+#
+#   python benchmarks/token_memory.py [book.txt ...]
+import glob
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from tokens import TokenSource
+
+BOOKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "books")
+
+
+def measure(load):
+    tracemalloc.start()
+    result = load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+def load_split(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().split()
+
+
+def load_tokens(path):
+    tokens = TokenSource(path)
+    tokens.wait()
+    return tokens
+
+
+def main(paths):
+    print(f"{'book':40} {'words':>8} {'split()':>12} {'TokenSource':>12} {'ratio':>7}")
+    for path in paths:
+        words, split_bytes, _ = measure(lambda: load_split(path))
+        tokens, token_bytes, _ = measure(lambda: load_tokens(path))
+        assert len(tokens) == len(words)
+        name = os.path.basename(path)[:40]
+        print(f"{name:40} {len(words):>8} {split_bytes:>12,} {token_bytes:>12,} "
+              f"{split_bytes / max(token_bytes, 1):>6.1f}x")
+        print(f"{'':40} {'':>8} {'per word':>12} {split_bytes / len(words):>11.1f}B "
+              f"{token_bytes / len(words):>11.1f}B")
+        tokens.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob(os.path.join(BOOKS_DIR, "*.txt"))))
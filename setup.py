@@ -1,9 +1,16 @@
-from setuptools import setup, find_packages
+import os
+
+from setuptools import setup
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
 
 setup(
     name="speedreader",
     version="1.0.0",
-    packages=find_packages(),
+    # The modules in src import each other by bare name, so they are
+    # installed as top-level modules rather than as a package
+    package_dir={"": "src"},
+    py_modules=sorted(name[:-3] for name in os.listdir(SRC_DIR) if name.endswith(".py")),
     install_requires=[
         "customtkinter>=5.2.2",
         "pyttsx3>=2.90",
@@ -13,7 +20,7 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'speedreader=src.speedreader:main',
+            'speedreader=speedreader:main',
         ],
     },
     author="Brinou",
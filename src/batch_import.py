@@ -0,0 +1,128 @@
+import glob
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import ingest
+from book_cache import BookCache
+
+# One finished file: how many are done out of total, the source path, and
+# whether it was imported, skipped as a duplicate, or failed
+Progress = namedtuple("Progress", "done total path status message")
+
+known_hashes = frozenset()  # Books already in the library, per worker process
+
+
+def init_worker(hashes):
+    global known_hashes
+    known_hashes = hashes
+
+
+def find_books(source):
+    # Supported books in a folder (recursively) or matching a glob pattern
+    if os.path.isdir(source):
+        paths = [
+            os.path.join(folder, name)
+            for folder, _, names in os.walk(source) for name in names
+        ]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.splitext(p)[1].lower() in ingest.BOOK_EXTENSIONS)
+
+
+def import_one(path, books_dir, cache_dir):
+    # Runs in a worker process: converts, deduplicates by content hash,
+    # writes the book and tokenizes it into the shared token cache
+    text, title, author = ingest.extract(path)
+    if not text.strip():
+        raise ingest.IngestError(f"No text found in {os.path.basename(path)}")
+    digest = ingest.text_digest(text)
+    if digest in known_hashes:
+        return "duplicate", None, digest
+    dest_path = ingest.write_book(path, text, title, author, books_dir)
+    tokens = BookCache(cache_dir).open(dest_path)
+    tokens.wait()
+    tokens.close()
+    return "imported", dest_path, digest
+
+
+class BatchImport:
+    # Imports many books with a process pool, driven from a background
+    # thread. Only a few files per worker are in flight at a time, so
+    # cancel() takes effect quickly; files already being converted finish.
+    # Progress is posted to `events` as one Progress per file, followed by
+    # None when the batch is over.
+    def __init__(self, paths, books_dir, cache_dir, known=(), workers=None):
+        self.paths = list(paths)
+        self.books_dir = books_dir
+        self.cache_dir = cache_dir
+        self.known = frozenset(known)
+        self.workers = workers or os.cpu_count() or 1
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.imported = []
+        self.duplicates = 0
+        self.failed = []
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            self.import_all()
+        finally:
+            self.events.put(None)
+
+    def import_all(self):
+        total = len(self.paths)
+        done = 0
+        remaining = iter(self.paths)
+        pending = {}
+        # Hash of each book imported by this batch, to catch copies of the
+        # same book under different names
+        seen = {}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                 initargs=(self.known,)) as pool:
+            while True:
+                while len(pending) < self.workers * 2 and not self.cancelled.is_set():
+                    path = next(remaining, None)
+                    if path is None:
+                        break
+                    pending[pool.submit(import_one, path, self.books_dir, self.cache_dir)] = path
+                if not pending:
+                    break
+                finished, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = pending.pop(future)
+                    done += 1
+                    self.events.put(Progress(done, total, path, *self.result(future, seen)))
+                if self.cancelled.is_set():
+                    for future in pending:
+                        future.cancel()
+
+    def result(self, future, seen):
+        if future.cancelled():
+            return "cancelled", ""
+        try:
+            status, dest_path, digest = future.result()
+        except (ingest.IngestError, OSError) as e:
+            self.failed.append(str(e))
+            return "failed", str(e)
+        if status == "imported" and digest in seen:
+            if seen[digest] != dest_path:
+                os.remove(dest_path)
+            status = "duplicate"
+        if status == "duplicate":
+            self.duplicates += 1
+            return status, ""
+        seen[digest] = dest_path
+        self.imported.append(dest_path)
+        return status, os.path.basename(dest_path)
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+from text_filters import DEFAULT_FILTERS, filter_book, filter_key
+from tokens import TOKENIZER_VERSION, TokenSource
+
+MAGIC = b"RSVPTOK\0"
+# magic, tokenizer version, byte order, offset item size, token count,
+# sentence count, paragraph count, chapter count
+HEADER = struct.Struct("<8sIBBxxQQQQ")
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+
+def build_filtered(cache_dir, filepath, base, filters):
+    # Runs in a separate process, so filtering a large book in the
+    # background does not compete with the reader for the interpreter lock
+    BookCache(cache_dir).filtered(filepath, base, filters)
+
+
+def file_hash(filepath):
+    digest = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BookCache:
+    # Pre-tokenized books on disk, one file per content hash. Each file holds
+    # a fixed header followed by the raw offset, length, flag and segment
+    # arrays, which are memory-mapped and used in place when a book is
+    # reopened. Files written by another tokenizer version are ignored and
+    # replaced. The least recently used files are evicted beyond max_bytes.
+    # Books that are not cached yet are tokenized with up to `workers`
+    # processes when they are large enough to benefit.
+    # Books are read through text filters first. The filtered text, the
+    # chapter titles the filters found and a map back to the original byte
+    # offsets are cached next to the token files, named by content hash and
+    # filter set, and it is the filtered text that gets tokenized, so word
+    # positions always refer to it. Filtered texts are about the size of the
+    # books themselves, so they are evicted within their own max_text_bytes.
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, workers=1,
+                 max_text_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_text_bytes = max_text_bytes
+        self.workers = workers
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.filter_locks = {}  # One lock per filtered text, so it is built once
+        self.filter_jobs = {}  # Background builds of filtered texts, running or failed
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        # Maps a book path to its size, mtime and content hash, so unchanged
+        # files are looked up without being hashed again
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        f, tmp_path = self.temporary(self.index_path, "w")
+        with f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def temporary(self, path, mode):
+        # A new file to write path's contents to before moving it into place.
+        # Every call gets its own name, as threads and import processes
+        # share the cache and may write the same file at once.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=os.path.basename(path) + ".",
+                                        suffix=".tmp")
+        return os.fdopen(fd, mode), tmp_path
+
+    def content_hash(self, filepath):
+        stat = os.stat(filepath)
+        key = os.path.abspath(filepath)
+        with self.lock:
+            entry = self.index.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["hash"]
+        digest = file_hash(filepath)
+        with self.lock:
+            self.index[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": digest}
+            self.save_index()
+        return digest
+
+    def cache_path(self, digest):
+        return os.path.join(self.cache_dir, digest + ".tok")
+
+    def open(self, filepath, filters=DEFAULT_FILTERS, wait=True):
+        # Returns a TokenSource for the book, from the cache when possible;
+        # otherwise the book is tokenized and cached once indexing completes.
+        # A filtered text that is not cached yet is built first, or with
+        # wait=False built in the background while the book is returned
+        # unfiltered; the returned tokens' filter_key tells which it is.
+        digest = self.content_hash(filepath)
+        chapter_names = {}
+        source_offsets = None
+        key = "raw"
+        if filters:
+            base = self.filtered_base(digest, filters)
+            try:
+                found = self.filtered(filepath, base, filters) if wait else self.read_filtered(base)
+            except OSError:
+                # Without room for the filtered text the book is read as is
+                found = None
+            if found is not None:
+                filepath, chapter_names, source_offsets = found
+                key = filter_key(filters)
+                digest = f"{digest}.{key}"
+        path = self.cache_path(digest)
+        tokens = self.read(filepath, path)
+        if tokens is None:
+            # Filtered text holds one word per token already; segmenting it
+            # again could split phrases and misalign the source offsets
+            tokens = TokenSource(filepath, on_complete=lambda t: self.write(t, path), workers=self.workers,
+                                 segmenter="auto" if key == "raw" else None)
+        tokens.chapter_names = chapter_names
+        tokens.filter_key = key
+        tokens.source_offsets = source_offsets
+        if filters and key == "raw" and not wait:
+            self.prepare(filepath, base, filters)
+        return tokens
+
+    def filtered_base(self, digest, filters):
+        return os.path.join(self.cache_dir, f"{digest}.{filter_key(filters)}")
+
+    def filter_lock(self, base):
+        with self.lock:
+            return self.filter_locks.setdefault(base, threading.Lock())
+
+    def prepare(self, filepath, base, filters):
+        # Starts building a filtered text in the background. A build that
+        # failed is not retried until the next session.
+        with self.lock:
+            if base in self.filter_jobs:
+                return
+            job = self.filter_jobs[base] = threading.Thread(
+                target=self.filter_job, args=(filepath, base, filters), daemon=True
+            )
+        job.start()
+
+    def filter_job(self, filepath, base, filters):
+        with self.filter_lock(base):
+            # A daemon process, so quitting does not wait for it to finish.
+            # Daemon processes cannot start workers, so it indexes on one core.
+            process = multiprocessing.Process(
+                target=build_filtered, args=(self.cache_dir, filepath, base, filters), daemon=True
+            )
+            try:
+                process.start()
+            except OSError:
+                return
+            process.join()
+            if process.exitcode:
+                return
+        with self.lock:
+            del self.filter_jobs[base]
+
+    def filtering(self, filepath, filters):
+        # True while the book's filtered text is being built in the background
+        base = self.filtered_base(self.content_hash(filepath), filters)
+        with self.lock:
+            job = self.filter_jobs.get(base)
+        return job is not None and job.is_alive()
+
+    def read_filtered(self, base):
+        # The cached filtered text, chapter titles and source offsets, or None
+        text_path, map_path, meta_path = base + ".txt", base + ".map", base + ".json"
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            offsets = array(meta["offsets"])
+            with open(map_path, "rb") as f:
+                offsets.frombytes(f.read())
+            os.utime(text_path)
+            os.utime(map_path)
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return text_path, dict(meta["chapters"]), offsets
+
+    def filtered(self, filepath, base, filters):
+        # Path of the book's filtered text, its chapter titles by word index
+        # and the source offset of every word, filtering the book in one
+        # streaming pass on first use. The offsets are kept in a .map file
+        # of raw array items; the metadata, written last, marks the set as
+        # complete.
+        text_path, map_path, meta_path = base + ".txt", base + ".map", base + ".json"
+        with self.filter_lock(base):
+            # Another thread may have built it while this one waited
+            found = self.read_filtered(base)
+            if found is not None:
+                return found
+            f, tmp_path = self.temporary(text_path, "wb")
+            try:
+                with f:
+                    source = TokenSource(filepath, workers=self.workers)
+                    try:
+                        source.wait()
+                        if source.failed:
+                            raise OSError(f"Could not index {filepath}")
+                        offsets = array("I" if len(source.data) < 1 << 32 else "Q")
+                        meta = filter_book(source, filters, f, offsets)
+                    finally:
+                        source.close()
+                os.replace(tmp_path, text_path)
+            except OSError:
+                self.remove(tmp_path)
+                raise
+            meta["offsets"] = offsets.typecode
+            for path, mode, write in ((map_path, "wb", offsets.tofile),
+                                      (meta_path, "w", lambda f: json.dump(meta, f))):
+                f, tmp_path = self.temporary(path, mode)
+                try:
+                    with f:
+                        write(f)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    self.remove(tmp_path)
+                    raise
+        self.evict()
+        return text_path, dict(meta["chapters"]), offsets
+
+    def read(self, filepath, path):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        with f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return None
+        try:
+            magic, version, byte_order, offset_size, count, sentences, paragraphs, chapters = \
+                HEADER.unpack_from(buffer)
+        except struct.error:
+            buffer.close()
+            return None
+        if magic != MAGIC or version != TOKENIZER_VERSION or byte_order != BYTE_ORDER:
+            buffer.close()
+            self.remove(path)
+            return None
+
+        view = memoryview(buffer)
+        views = []
+        pos = HEADER.size
+        for fmt, size, n in (("I" if offset_size == 4 else "Q", offset_size, count),
+                             ("I", 4, count), ("B", 1, count),
+                             ("I", 4, sentences), ("I", 4, paragraphs), ("I", 4, chapters)):
+            length = size * n
+            views.append(view[pos:pos + length].cast(fmt))
+            pos += length + (-length % 8)
+        view.release()
+
+        # Mark as recently used for eviction
+        os.utime(path)
+        tokens = TokenSource(filepath, index=tuple(views))
+        tokens.index_buffer = buffer
+        return tokens
+
+    def write(self, tokens, path):
+        arrays = tokens.arrays()
+        try:
+            f, tmp_path = self.temporary(path, "wb")
+        except OSError:
+            return
+        try:
+            with f:
+                f.write(HEADER.pack(MAGIC, TOKENIZER_VERSION, BYTE_ORDER, tokens.offsets.itemsize,
+                                    len(tokens.offsets), len(tokens.sentence_starts),
+                                    len(tokens.paragraph_starts), len(tokens.chapter_starts)))
+                for values in arrays:
+                    data = values.tobytes()
+                    f.write(data)
+                    f.write(b"\0" * (-len(data) % 8))
+            os.replace(tmp_path, path)
+        except OSError:
+            self.remove(tmp_path)
+            return
+        self.evict()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        # Token files and filtered texts are evicted separately, least
+        # recently used first, each kind within its own budget. A filtered
+        # text goes together with its map and metadata.
+        groups = {}
+        for name in os.listdir(self.cache_dir):
+            base, ext = os.path.splitext(name)
+            if ext not in (".tok", ".txt", ".map", ".json") or name == "index.json":
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            group = groups.setdefault((ext == ".tok", base), [0, 0, []])
+            group[0] = max(group[0], stat.st_mtime)
+            group[1] += stat.st_size
+            group[2].append(path)
+        for tokens, limit in ((True, self.max_bytes), (False, self.max_text_bytes)):
+            entries = sorted(group for (kind, _), group in groups.items() if kind == tokens)
+            total = sum(size for _, size, _ in entries)
+            for _, size, paths in entries:
+                if total <= limit:
+                    break
+                # Metadata first, so a partly removed set is never read
+                for path in sorted(paths, key=lambda path: not path.endswith(".json")):
+                    self.remove(path)
+                total -= size
@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+class BookmarkStore:
+    # Bookmarks kept in SQLite and mirrored in memory per book, so each new
+    # bookmark is a single insert and listing them never reads the database.
+    def __init__(self, db_path, legacy_path=None):
+        self.db_path = db_path
+        self.by_book = {}
+        with self.connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS bookmarks (
+                    id INTEGER PRIMARY KEY,
+                    book TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    word TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    byte_position INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS bookmarks_book ON bookmarks (book)")
+            # position is a byte offset in the book file. Bookmarks from
+            # before, and those imported from bookmarks.json, hold a word
+            # index into the unfiltered text and have byte_position 0 until
+            # converted. Existing ones hold word indices while their book's
+            # catalog row does.
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(bookmarks)")}
+            if "byte_position" not in columns:
+                db.execute("ALTER TABLE bookmarks ADD COLUMN byte_position INTEGER NOT NULL DEFAULT 1")
+                catalog = {row["name"] for row in db.execute("PRAGMA table_info(books)")}
+                if "byte_positions" in catalog:
+                    db.execute("""
+                        UPDATE bookmarks SET byte_position = 0
+                        WHERE book IN (SELECT filename FROM books WHERE byte_positions = 0)
+                    """)
+        if legacy_path:
+            self.import_legacy(legacy_path)
+        with self.connect() as db:
+            for row in db.execute("SELECT book, position, word, timestamp, byte_position FROM bookmarks "
+                                  "ORDER BY id"):
+                self.by_book.setdefault(row["book"], []).append(dict(row))
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def import_legacy(self, legacy_path):
+        # Bookmarks from the old bookmarks.json are moved over once. They
+        # hold word indices, converted when their book is next opened.
+        try:
+            if not os.path.exists(legacy_path) or os.path.getsize(legacy_path) == 0:
+                return
+            with open(legacy_path, "r") as f:
+                bookmarks = json.load(f)
+        except (OSError, ValueError):
+            return
+        rows = [
+            (b["book"], b["position"], b.get("word", ""), b.get("timestamp", ""))
+            for b in bookmarks if "book" in b and "position" in b
+        ]
+        with self.connect() as db:
+            db.executemany(
+                "INSERT INTO bookmarks (book, position, word, timestamp, byte_position) VALUES (?, ?, ?, ?, 0)",
+                rows
+            )
+        os.replace(legacy_path, legacy_path + ".imported")
+
+    def add(self, book, position, word, timestamp):
+        bookmark = {"book": book, "position": position, "word": word, "timestamp": timestamp, "byte_position": 1}
+        with self.connect() as db:
+            db.execute(
+                "INSERT INTO bookmarks (book, position, word, timestamp) VALUES (?, ?, ?, ?)",
+                (book, position, word, timestamp)
+            )
+        self.by_book.setdefault(book, []).append(bookmark)
+        return bookmark
+
+    def has_word_positions(self, book):
+        return any(not bookmark["byte_position"] for bookmark in self.by_book.get(book, []))
+
+    def convert_positions(self, book, convert):
+        # Turns the positions of a book's bookmarks still holding word
+        # indices into byte offsets through convert. The bookmarks in memory
+        # are updated in place, so ones already handed out follow.
+        with self.connect() as db:
+            rows = db.execute("SELECT id, position FROM bookmarks WHERE book = ? AND byte_position = 0",
+                              (book,)).fetchall()
+            db.executemany("UPDATE bookmarks SET position = ?, byte_position = 1 WHERE id = ?",
+                           [(convert(row["position"]), row["id"]) for row in rows])
+        for bookmark in self.by_book.get(book, []):
+            if not bookmark["byte_position"]:
+                bookmark["position"] = convert(bookmark["position"])
+                bookmark["byte_position"] = 1
+
+    def all(self):
+        return [bookmark for bookmarks in self.by_book.values() for bookmark in bookmarks]
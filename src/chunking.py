@@ -0,0 +1,72 @@
+import string
+from array import array
+
+from tokens import CHAPTER_END, PARAGRAPH_END, PUNCTUATION, SENTENCE_END
+
+CHUNK_WORDS = 4  # Most words shown in one fixation
+CHUNK_CHARS = 18  # Widest chunk, in widths of the letter "n"
+# A chunk never runs past a word with any of these flags
+BREAK_FLAGS = SENTENCE_END | PARAGRAPH_END | PUNCTUATION | CHAPTER_END
+# Words that belong with the word after them, so they are never left at
+# the end of a chunk when that word does not fit
+FUNCTION_WORDS = frozenset("""
+    a an the of to in on at by for from with into onto upon over under about
+    and or but nor as if than that this these those so not no
+    is was are were be been am has had have do does did will would can could
+    my his her its our your their i he she it we you they
+""".split())
+# Characters measured up front for each font; any other character counts as
+# the widest of these
+MEASURED_CHARS = string.ascii_letters + string.digits + string.punctuation + " ‘’“”—–…"
+
+
+def measure_chars(measure, chars=MEASURED_CHARS):
+    # Pixel width of each character, from a font's measure function
+    return {char: measure(char) for char in chars}
+
+
+class TextWidths:
+    # Word widths summed from per-character widths, cached per word. Kerning
+    # is ignored, which is close enough for deciding what fits on a line.
+    def __init__(self, char_widths):
+        self.char_widths = char_widths
+        self.fallback = max(char_widths.values()) if char_widths else 1
+        self.space = char_widths.get(" ", self.fallback)
+        self.max_width = char_widths.get("n", self.fallback) * CHUNK_CHARS
+        self.words = {}
+
+    def __call__(self, word):
+        width = self.words.get(word)
+        if width is None:
+            get = self.char_widths.get
+            fallback = self.fallback
+            width = self.words[word] = sum(get(char, fallback) for char in word)
+        return width
+
+
+def chunk_starts(tokens, widths, max_words=CHUNK_WORDS):
+    # Word index where each chunk starts. Words are added to a chunk while
+    # they fit within widths.max_width, up to max_words, and a chunk ends at
+    # any punctuation or break. A function word that would end a chunk moves
+    # on to start the next one with the word it belongs to.
+    count = len(tokens)
+    flags = tokens.flags
+    space = widths.space
+    max_width = widths.max_width
+    starts = array("I")
+    i = 0
+    while i < count:
+        starts.append(i)
+        used = widths(tokens[i])
+        end = i + 1
+        while end < count and end - i < max_words and not flags[end - 1] & BREAK_FLAGS:
+            width = widths(tokens[end])
+            if used + space + width > max_width:
+                break
+            used += space + width
+            end += 1
+        if end < count and not flags[end - 1] & BREAK_FLAGS:
+            while end - i > 1 and tokens[end - 1].lower() in FUNCTION_WORDS:
+                end -= 1
+        i = end
+    return starts
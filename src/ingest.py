@@ -0,0 +1,295 @@
+import codecs
+import hashlib
+import html
+import os
+import posixpath
+import re
+import zipfile
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+# Paragraphs are separated by a blank line and chapters by a form feed, which
+# TokenSource turns into PARAGRAPH_END and CHAPTER_END flags
+PARAGRAPH_BREAK = "\n\n"
+CHAPTER_BREAK = "\n\n\f\n\n"
+FALLBACK_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+BOOK_EXTENSIONS = (".txt", ".text", ".html", ".htm", ".xhtml", ".md", ".markdown", ".epub", ".pdf")
+FILE_TYPES = [
+    ("Books", " ".join("*" + ext for ext in BOOK_EXTENSIONS)),
+    ("Text Files", "*.txt"),
+    ("EPUB", "*.epub"),
+    ("HTML", "*.html *.htm *.xhtml"),
+    ("Markdown", "*.md *.markdown"),
+    ("PDF", "*.pdf"),
+]
+BLANK_LINES_RE = re.compile(r"\n\s*\n")
+SPACES_RE = re.compile(r"[ \t\r\xa0]+")
+UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class IngestError(Exception):
+    pass
+
+
+def decode_text(data):
+    # UTF-8 or UTF-16 when marked with a BOM, otherwise the first encoding
+    # that decodes cleanly; latin-1 accepts anything
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if data.startswith(bom):
+            return data.decode(encoding, errors="replace")
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def clean_paragraphs(text):
+    # One paragraph per block of lines, with runs of spaces collapsed
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    paragraphs = (SPACES_RE.sub(" ", block).strip() for block in BLANK_LINES_RE.split(text))
+    return PARAGRAPH_BREAK.join(p for p in paragraphs if p)
+
+
+class HTMLText(HTMLParser):
+    # Visible text of an HTML document. Block elements end a paragraph, and
+    # top-level headings start a new chapter unless nothing precedes them.
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "blockquote", "section", "article",
+                  "h3", "h4", "h5", "h6", "pre", "hr", "dt", "dd", "table", "ul", "ol"}
+    CHAPTER_TAGS = {"h1", "h2"}
+    SKIP_TAGS = {"script", "style", "head", "title", "nav"}
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+        self.title = ""
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self.in_title = True
+        if tag in self.SKIP_TAGS:
+            self.skipping += 1
+        elif tag in self.CHAPTER_TAGS:
+            self.chapter_break()
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(PARAGRAPH_BREAK)
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+        if tag in self.SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCK_TAGS or tag in self.CHAPTER_TAGS:
+            self.parts.append(PARAGRAPH_BREAK)
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        if not self.skipping:
+            self.parts.append(data.replace("\n", " "))
+
+    def chapter_break(self):
+        if "".join(self.parts).strip():
+            self.parts.append(CHAPTER_BREAK)
+
+    def text(self):
+        chapters = "".join(self.parts).split("\f")
+        return CHAPTER_BREAK.join(c for c in (clean_paragraphs(c) for c in chapters) if c)
+
+
+def html_to_text(markup):
+    parser = HTMLText()
+    parser.feed(markup)
+    parser.close()
+    return parser.text(), parser.title.strip()
+
+
+def read_txt(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    text = decode_text(data).replace("\r\n", "\n").replace("\r", "\n")
+    return text, "", ""
+
+
+def text_digest(text):
+    # Hash of a book's text as write_book stores it, so a converted book and
+    # a text file already in the library compare equal whatever their
+    # original encoding or line endings
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def read_html(path):
+    with open(path, "rb") as f:
+        text, title = html_to_text(decode_text(f.read()))
+    return text, title, ""
+
+
+MD_RULES = [
+    (re.compile(r"^```.*$", re.MULTILINE), ""),
+    (re.compile(r"!\[[^\]]*\]\([^)]*\)"), ""),  # Images
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r"\1"),  # Links keep their text
+    (re.compile(r"<[^>\n]+>"), ""),  # Inline HTML
+    (re.compile(r"^\s{0,3}(?:[-*+]|\d+[.)])\s+", re.MULTILINE), ""),  # List markers
+    (re.compile(r"^\s{0,3}>\s?", re.MULTILINE), ""),  # Block quotes
+    (re.compile(r"^\s{0,3}(?:[-*_]\s*){3,}$", re.MULTILINE), ""),  # Rules
+    (re.compile(r"(\*\*|__|\*|_|`)(?=\S)(.+?)(?<=\S)\1"), r"\2"),  # Emphasis and code
+]
+MD_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$", re.MULTILINE)
+
+
+def read_markdown(path):
+    with open(path, "rb") as f:
+        source = decode_text(f.read()).replace("\r\n", "\n")
+    title = ""
+    chapters = []
+    # Level 1 and 2 headings start chapters; lower ones are paragraphs
+    position = 0
+    for match in MD_HEADING_RE.finditer(source):
+        if len(match.group(1)) <= 2:
+            chapters.append(source[position:match.start()])
+            position = match.start()
+            title = title or match.group(2)
+    chapters.append(source[position:])
+    texts = []
+    for chapter in chapters:
+        chapter = MD_HEADING_RE.sub(lambda m: "\n" + m.group(2) + "\n", chapter)
+        for pattern, replacement in MD_RULES:
+            chapter = pattern.sub(replacement, chapter)
+        chapter = clean_paragraphs(html.unescape(chapter))
+        if chapter:
+            texts.append(chapter)
+    return CHAPTER_BREAK.join(texts), title, ""
+
+
+def epub_rootfile(book):
+    container = ElementTree.fromstring(book.read("META-INF/container.xml"))
+    for element in container.iter():
+        if element.tag.endswith("rootfile") and element.get("full-path"):
+            return element.get("full-path")
+    raise IngestError("EPUB has no package document")
+
+
+def read_epub(path):
+    # Spine documents in reading order, one chapter each
+    try:
+        with zipfile.ZipFile(path) as book:
+            opf_path = epub_rootfile(book)
+            package = ElementTree.fromstring(book.read(opf_path))
+            base = posixpath.dirname(opf_path)
+            title = author = ""
+            manifest = {}
+            spine = []
+            for element in package.iter():
+                tag = element.tag.rsplit("}", 1)[-1]
+                if tag == "title" and not title:
+                    title = (element.text or "").strip()
+                elif tag == "creator" and not author:
+                    author = (element.text or "").strip()
+                elif tag == "item":
+                    manifest[element.get("id")] = element.get("href", "")
+                elif tag == "itemref":
+                    spine.append(element.get("idref"))
+            chapters = []
+            for idref in spine:
+                href = manifest.get(idref)
+                if not href:
+                    continue
+                name = posixpath.normpath(posixpath.join(base, unquote(href.split("#")[0])))
+                try:
+                    markup = decode_text(book.read(name))
+                except KeyError:
+                    continue
+                text, _ = html_to_text(markup)
+                if text:
+                    chapters.append(text)
+    except (zipfile.BadZipFile, ElementTree.ParseError, KeyError) as e:
+        raise IngestError(f"Not a readable EPUB: {e}")
+    return CHAPTER_BREAK.join(chapters), title, author
+
+
+def read_pdf(path):
+    # PDF text needs pypdf, which is optional
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise IngestError("PDF import needs the pypdf package (pip install pypdf)")
+    try:
+        reader = PdfReader(path)
+        pages = [page.extract_text() or "" for page in reader.pages]
+        info = reader.metadata or {}
+    except Exception as e:
+        raise IngestError(f"Not a readable PDF: {e}")
+    text = clean_paragraphs("\n\n".join(pages))
+    return text, str(info.get("/Title") or ""), str(info.get("/Author") or "")
+
+
+READERS = {
+    ".txt": read_txt,
+    ".text": read_txt,
+    ".html": read_html,
+    ".htm": read_html,
+    ".xhtml": read_html,
+    ".md": read_markdown,
+    ".markdown": read_markdown,
+    ".epub": read_epub,
+    ".pdf": read_pdf,
+}
+
+
+def extract(path):
+    # (text, title, author) for any supported format
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise IngestError(f"Unsupported format: {os.path.basename(path)}")
+    return reader(path)
+
+
+def book_filename(path, title, author):
+    # Library file name. Text files keep theirs; converted books are named
+    # "Author - Title", which read_metadata understands.
+    name, ext = os.path.splitext(os.path.basename(path))
+    if ext.lower() == ".txt":
+        return name + ext
+    stem = f"{author} - {title}" if author and title else title or name
+    return UNSAFE_NAME_RE.sub(" ", stem).strip()[:150] + ".txt"
+
+
+def write_book(path, text, title, author, books_dir):
+    # Writes converted text to the books directory and returns its path. A
+    # different book that already has the name gets a numbered one instead.
+    data = text.encode("utf-8")
+    name, ext = os.path.splitext(book_filename(path, title, author))
+    number = 1
+    while True:
+        dest_path = os.path.join(books_dir, name + ext)
+        try:
+            # Claiming the name atomically keeps parallel imports apart
+            fd = os.open(dest_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            with open(dest_path, "rb") as f:
+                if f.read() == data:
+                    return dest_path
+        number += 1
+        name = f"{os.path.splitext(book_filename(path, title, author))[0]} ({number})"
+    tmp_path = dest_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def import_book(path, books_dir):
+    # Converts a book to UTF-8 text in the books directory and returns the
+    # new path. Runs in a worker process, so it only takes and returns
+    # plain values.
+    text, title, author = extract(path)
+    if not text.strip():
+        raise IngestError(f"No text found in {os.path.basename(path)}")
+    return write_book(path, text, title, author, books_dir)
@@ -0,0 +1,272 @@
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from book_cache import BookCache
+from ingest import read_txt, text_digest
+from search_index import SearchIndex
+from text_filters import DEFAULT_FILTERS, FILTERS, filter_key
+
+HEADER_RE = re.compile(r"^\s*(title|author)\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+SORT_ORDERS = {
+    "Title": "title COLLATE NOCASE",
+    "Author": "author COLLATE NOCASE, title COLLATE NOCASE",
+    "Recent": "last_opened DESC, title COLLATE NOCASE",
+    "Length": "word_count DESC",
+}
+
+
+def read_metadata(filepath, filename):
+    # Title and author from a "Title:"/"Author:" header near the top of the
+    # file, falling back to an "Author - Title" file name
+    stem = os.path.splitext(filename)[0]
+    author, _, title = stem.partition(" - ")
+    if not title:
+        author, title = "", stem
+    try:
+        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(4096)
+    except OSError:
+        head = ""
+    for key, value in HEADER_RE.findall(head):
+        if key.lower() == "title":
+            title = value
+        else:
+            author = value
+    return title, author
+
+
+def parse_filters(value):
+    # Text filters stored for a book, as a tuple of filter names
+    if value is None:
+        return DEFAULT_FILTERS
+    return tuple(name for name in value.split(",") if name in FILTERS)
+
+
+def search_key(digest, filters):
+    # Word positions depend on the filters, so the search index records both
+    return f"{digest}.{filter_key(filters)}"
+
+
+def refresh_catalog(db_path, books_dir, cache_dir, search_path):
+    # Runs in a separate process, so indexing and filtering new books does
+    # not compete with the reader for the interpreter lock
+    search_index = SearchIndex(search_path) if search_path else None
+    LibraryCatalog(db_path, books_dir, BookCache(cache_dir), search_index).refresh()
+
+
+class LibraryCatalog:
+    # Persistent catalog of the books directory. refresh() only reopens files
+    # whose size or mtime changed since the last scan, or that are missing
+    # from the full-text search index. refresh_async() runs it in a daemon
+    # process, watched by a thread that starts it again when another
+    # refresh was asked for in the meantime.
+    def __init__(self, db_path, books_dir, book_cache, search_index=None):
+        self.db_path = db_path
+        self.books_dir = books_dir
+        self.book_cache = book_cache
+        self.search_index = search_index
+        self.lock = threading.Lock()
+        self.refresh_thread = None  # Set while a background refresh runs
+        self.refresh_wanted = False
+        with self.connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS books (
+                    filename TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    word_count INTEGER NOT NULL,
+                    last_position INTEGER NOT NULL DEFAULT 0,
+                    last_opened TEXT
+                )
+            """)
+            # Catalogs from before per-book text filters gain the column;
+            # NULL means the default filters
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(books)")}
+            if "filters" not in columns:
+                db.execute("ALTER TABLE books ADD COLUMN filters TEXT")
+            # Duplicate detection compares text_hash, the hash of the text as
+            # an import would write it; NULL until the book is next indexed
+            if "text_hash" not in columns:
+                db.execute("ALTER TABLE books ADD COLUMN text_hash TEXT")
+            # last_position is a byte offset in the book file, which holds
+            # whatever filters are applied. Rows from before hold a word
+            # index instead and have byte_positions 0 until converted.
+            if "byte_positions" not in columns:
+                db.execute("ALTER TABLE books ADD COLUMN byte_positions INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def connect(self):
+        # One connection per call, so the catalog can be used from any thread
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def refresh(self):
+        searchable = self.search_index.indexed_books() if self.search_index else {}
+        known = {}
+        with self.connect() as db:
+            for row in db.execute("SELECT filename, size, mtime, hash, filters, text_hash FROM books"):
+                known[row["filename"]] = (row["size"], row["mtime"]) if row["text_hash"] else None
+                # Books not yet in the search index, or indexed with other
+                # filters, are indexed again
+                key = search_key(row["hash"], parse_filters(row["filters"]))
+                if self.search_index and key != searchable.get(row["filename"]):
+                    known[row["filename"]] = None
+
+        seen = set()
+        for entry in os.scandir(self.books_dir):
+            # Files still being written by an import are picked up next time
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            if known.get(entry.name) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            try:
+                self.index_book(entry.path, entry.name, stat)
+            except OSError:
+                continue
+
+        removed = [(name,) for name in known if name not in seen]
+        if removed:
+            with self.connect() as db:
+                db.executemany("DELETE FROM books WHERE filename = ?", removed)
+            if self.search_index:
+                for (name,) in removed:
+                    self.search_index.remove_book(name)
+
+    def refresh_async(self):
+        with self.lock:
+            self.refresh_wanted = True
+            if self.refresh_thread is None:
+                self.refresh_thread = threading.Thread(target=self.refresh_job, daemon=True)
+                self.refresh_thread.start()
+
+    def refresh_job(self):
+        search_path = self.search_index.db_path if self.search_index else None
+        while True:
+            with self.lock:
+                if not self.refresh_wanted:
+                    self.refresh_thread = None
+                    return
+                self.refresh_wanted = False
+            # A daemon process, so quitting does not wait for it to finish.
+            # Daemon processes cannot start workers, so it indexes on one core.
+            process = multiprocessing.Process(
+                target=refresh_catalog, args=(self.db_path, self.books_dir, self.book_cache.cache_dir, search_path),
+                daemon=True
+            )
+            try:
+                process.start()
+            except OSError:
+                continue
+            process.join()
+
+    @property
+    def refreshing(self):
+        return self.refresh_thread is not None
+
+    def index_book(self, filepath, filename, stat=None):
+        stat = stat or os.stat(filepath)
+        title, author = read_metadata(filepath, filename)
+        filters = self.get_filters(filename)
+        tokens = self.book_cache.open(filepath, filters)
+        tokens.wait()
+        if tokens.failed:
+            # Indexed again on the next refresh
+            tokens.close()
+            raise OSError(f"Could not index {filepath}")
+        word_count = len(tokens)
+        digest = self.book_cache.content_hash(filepath)
+        text_hash = text_digest(read_txt(filepath)[0])
+        if self.search_index:
+            self.search_index.add_book(filename, search_key(digest, filters), tokens)
+        tokens.close()
+        with self.connect() as db:
+            db.execute("""
+                INSERT INTO books (filename, title, author, size, mtime, hash, text_hash, word_count,
+                                   byte_positions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(filename) DO UPDATE SET
+                    title = excluded.title, author = excluded.author,
+                    size = excluded.size, mtime = excluded.mtime, hash = excluded.hash,
+                    text_hash = excluded.text_hash, word_count = excluded.word_count
+            """, (filename, title, author, stat.st_size, stat.st_mtime_ns, digest, text_hash, word_count))
+
+    def hashes(self):
+        # Text hashes of the library's books, comparable with
+        # ingest.text_digest of a book being imported
+        with self.connect() as db:
+            return {row["text_hash"] for row in db.execute("SELECT text_hash FROM books WHERE text_hash != ''")}
+
+    def books(self, search="", sort="Title"):
+        query = "SELECT * FROM books"
+        params = ()
+        if search:
+            query += " WHERE title LIKE ? OR author LIKE ?"
+            pattern = f"%{search}%"
+            params = (pattern, pattern)
+        query += " ORDER BY " + SORT_ORDERS.get(sort, SORT_ORDERS["Title"])
+        with self.connect() as db:
+            return db.execute(query, params).fetchall()
+
+    def mark_opened(self, filename):
+        # Books not scanned yet get a placeholder row; its zero size and
+        # mtime make the next refresh index it without losing last_opened
+        title, author = read_metadata(os.path.join(self.books_dir, filename), filename)
+        with self.connect() as db:
+            db.execute("""
+                INSERT INTO books (filename, title, author, size, mtime, hash, word_count, last_opened,
+                                   byte_positions)
+                VALUES (?, ?, ?, 0, 0, '', 0, ?, 1)
+                ON CONFLICT(filename) DO UPDATE SET last_opened = excluded.last_opened
+            """, (filename, title, author, time.strftime("%Y-%m-%d %H:%M:%S")))
+
+    def has_word_positions(self, filename):
+        # True for a book whose last position still holds a word index into
+        # its unfiltered text
+        with self.connect() as db:
+            row = db.execute("SELECT byte_positions FROM books WHERE filename = ?", (filename,)).fetchone()
+        return row is not None and not row["byte_positions"]
+
+    def get_position(self, filename):
+        with self.connect() as db:
+            row = db.execute("SELECT last_position FROM books WHERE filename = ?", (filename,)).fetchone()
+        return row["last_position"] if row else 0
+
+    def get_filters(self, filename):
+        with self.connect() as db:
+            row = db.execute("SELECT filters FROM books WHERE filename = ?", (filename,)).fetchone()
+        return parse_filters(row["filters"] if row else None)
+
+    def set_filters(self, filename, filters):
+        with self.connect() as db:
+            db.execute("UPDATE books SET filters = ? WHERE filename = ?", (",".join(filters), filename))
+
+    def convert_position(self, filename, convert):
+        # Turns a last_position still holding a word index into a byte offset
+        # through convert, unless an offset has been saved in the meantime
+        with self.connect() as db:
+            row = db.execute("SELECT last_position FROM books WHERE filename = ? AND byte_positions = 0",
+                             (filename,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE books SET last_position = ?, byte_positions = 1 WHERE filename = ?",
+                           (convert(row["last_position"]), filename))
+
+    def set_position(self, filename, position):
+        # position is a byte offset in the book file (TokenSource.source_offset)
+        with self.connect() as db:
+            db.execute("UPDATE books SET last_position = ?, byte_positions = 1 WHERE filename = ?",
+                       (position, filename))
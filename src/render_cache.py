@@ -0,0 +1,160 @@
+from collections import OrderedDict, namedtuple
+
+import tkinter
+
+import customtkinter as ctk
+
+from chunking import measure_chars
+from rsvp import display_text, orp_split
+
+LOOKAHEAD = 64  # Upcoming words rendered ahead of the reader
+MAX_ENTRIES = 4096
+
+# Text as shown, the font to show it in and its width in pixels. ORP entries
+# also hold the word split around its pivot letter and the x offset of each
+# part from the fixed pivot anchor.
+Rendered = namedtuple("Rendered", "text font width parts offsets")
+
+
+class RenderCache:
+    # Display strings, font objects and text widths for the reading label.
+    # Entries for upcoming words are prepared ahead of time, so presenting a
+    # frame is a dictionary lookup, and the label is only reconfigured when
+    # its text or font actually changes. The label keeps the width of the
+    # widest word seen in the current font, so it does not resize (and make
+    # Tk lay the window out again) on every word.
+    def __init__(self, label, max_width, orp_view=None, max_entries=MAX_ENTRIES):
+        self.label = label
+        self.orp_view = orp_view
+        self.max_width = max_width
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.char_widths = {}
+        self.entries = OrderedDict()
+        self.width = 0
+        self.width_key = None
+
+    def font(self, family, size):
+        key = (family, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = ctk.CTkFont(family=family, size=size, weight="bold")
+        return font
+
+    def widths(self, family, size):
+        # Character widths in a font, measured once, for laying out chunks
+        key = (family, size)
+        widths = self.char_widths.get(key)
+        if widths is None:
+            widths = self.char_widths[key] = measure_chars(self.font(family, size).measure)
+        return widths
+
+    def get(self, text, display_mode, family, size):
+        key = (text, display_mode, family, size)
+        entry = self.entries.get(key)
+        if entry is None:
+            return self.render(key)
+        self.entries.move_to_end(key)
+        return entry
+
+    def render(self, key):
+        text, display_mode, family, size = key
+        shown, shown_size = display_text(text, display_mode, size)
+        font = self.font(family, shown_size)
+        parts = offsets = None
+        if display_mode == "orp" and " " not in text:
+            parts = orp_split(text)
+            before = font.measure(parts[0])
+            pivot = font.measure(parts[1])
+            # Centre the pivot letter on the anchor
+            offsets = (-before - pivot // 2, -pivot // 2, pivot - pivot // 2)
+        entry = self.entries[key] = Rendered(shown, font, font.measure(shown), parts, offsets)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def prefetch(self, texts, display_mode, family, size):
+        for text in texts:
+            key = (text, display_mode, family, size)
+            if key not in self.entries:
+                self.render(key)
+
+    def show(self, text, display_mode, family, size):
+        entry = self.get(text, display_mode, family, size)
+        if display_mode == "orp" and self.orp_view:
+            self.orp_view.show(entry)
+            return entry
+        label = self.label
+        changes = {}
+        if label.cget("font") is not entry.font:
+            changes["font"] = entry.font
+        if label.cget("text") != entry.text:
+            changes["text"] = entry.text
+        # The width only grows until the display settings change
+        width_key = (display_mode, family, size)
+        if width_key != self.width_key:
+            self.width_key = width_key
+            self.width = 0
+        width = min(entry.width, self.max_width)
+        if width > self.width:
+            self.width = changes["width"] = width
+        if changes:
+            label.configure(**changes)
+        return entry
+
+
+class OrpView:
+    # Canvas that shows a word with its pivot letter highlighted and held at
+    # a fixed horizontal anchor, so the eye never has to move. Each frame
+    # only moves three text items to offsets measured ahead of time.
+    def __init__(self, parent, height, wraplength, bg, fg, highlight):
+        self.canvas = tkinter.Canvas(parent, height=height, bg=bg, highlightthickness=0)
+        self.wraplength = wraplength
+        self.anchor_x = 0
+        self.middle_y = height // 2
+        self.font = None
+        self.shown = None
+        self.before = self.canvas.create_text(0, self.middle_y, anchor="w", fill=fg)
+        self.pivot = self.canvas.create_text(0, self.middle_y, anchor="w", fill=highlight)
+        self.after = self.canvas.create_text(0, self.middle_y, anchor="w", fill=fg)
+        self.canvas.bind("<Configure>", self.on_resize)
+
+    def on_resize(self, event):
+        self.anchor_x = event.width // 2
+        self.middle_y = event.height // 2
+        shown, self.shown = self.shown, None
+        if shown is not None:
+            self.show(shown)
+
+    def set_colors(self, bg, fg, highlight):
+        self.canvas.configure(bg=bg)
+        self.canvas.itemconfigure(self.before, fill=fg)
+        self.canvas.itemconfigure(self.pivot, fill=highlight)
+        self.canvas.itemconfigure(self.after, fill=fg)
+
+    def show(self, entry):
+        if entry is self.shown:
+            return
+        canvas = self.canvas
+        if entry.font is not self.font:
+            self.font = entry.font
+            for item in (self.before, self.pivot, self.after):
+                canvas.itemconfigure(item, font=entry.font)
+        if entry.parts is None:
+            # Several words at once have no single pivot; centre them instead
+            canvas.itemconfigure(self.before, text="")
+            canvas.itemconfigure(self.pivot, text="")
+            canvas.itemconfigure(self.after, text=entry.text, width=self.wraplength, anchor="center",
+                                 justify="center")
+            canvas.coords(self.after, self.anchor_x, self.middle_y)
+        else:
+            if self.shown is None or self.shown.parts is None:
+                canvas.itemconfigure(self.after, width=0, anchor="w", justify="left")
+            for item, text, offset in zip((self.before, self.pivot, self.after), entry.parts, entry.offsets):
+                canvas.itemconfigure(item, text=text)
+                canvas.coords(item, self.anchor_x + offset, self.middle_y)
+        self.shown = entry
+
+    def message(self, text):
+        # Plain centred text, such as prompts between books
+        self.show(Rendered(text, self.font, 0, None, None))
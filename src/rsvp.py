@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+from chunking import TextWidths, chunk_starts
+from timing import cumulative_weights
+
+PARAGRAPH_WORD_LIMIT = 50  # Longest paragraph shown in a single frame
+ORP_FRACTION = 0.35  # Position of the optimal recognition point within a word
+
+# A frame shows words [start, end) of the book for duration seconds
+Frame = namedtuple("Frame", "text start end duration")
+
+
+class RSVPEngine:
+    # Turns a token source into display frames without any UI dependency.
+    # The Tk front end asks for one frame at a time; benchmarks and tools can
+    # iterate the whole stream with frames().
+    def __init__(self, tokens, mode="word", speed=0.09, common_words=None):
+        self.tokens = tokens
+        self.mode = mode  # word, chunk, sentence, or paragraph
+        self.speed = speed  # Seconds per frame, or per average word with natural timing
+        self.common_words = common_words
+        self.natural_timing = True
+        self.timing = None  # Cumulative word weights, once computed
+        self.timing_thread = None
+        # Chunk mode: chunk starts for the current book, per font, and the
+        # font in use with its character widths
+        self.chunk_layouts = {}
+        self.chunks = None
+        self.chunk_key = None
+        self.char_widths = None
+        self.chunk_thread = None
+
+    def load(self, tokens):
+        # Switch to another book; its word weights are computed in the
+        # background once indexing completes, and frames use the fixed
+        # speed until then
+        self.tokens = tokens
+        self.timing = None
+        self.chunk_layouts = {}
+        self.chunks = None
+        # Chunks are laid out for the new book only by set_chunk_font, so
+        # the font is forgotten unless they are laid out here
+        key, self.chunk_key = self.chunk_key, None
+        if hasattr(tokens, "lengths"):
+            self.timing_thread = threading.Thread(target=self.compute_timing, args=(tokens,), daemon=True)
+            self.timing_thread.start()
+            if self.mode == "chunk" and key is not None:
+                self.set_chunk_font(key, self.char_widths)
+
+    def compute_timing(self, tokens=None):
+        if tokens is None:
+            tokens = self.tokens
+        tokens.wait()
+        try:
+            timing = cumulative_weights(tokens, self.common_words)
+        except ValueError:
+            # The book was closed while its weights were being computed
+            return
+        if tokens is self.tokens:
+            self.timing = timing
+
+    def set_chunk_font(self, key, char_widths):
+        # Chunk boundaries depend on the font, so they are worked out once
+        # per book and font key in the background. Until they are ready,
+        # chunk mode shows one word per frame.
+        self.chunk_key = key
+        self.char_widths = char_widths
+        self.chunks = self.chunk_layouts.get(key)
+        if self.chunks is None and hasattr(self.tokens, "flags"):
+            self.chunk_thread = threading.Thread(
+                target=self.compute_chunks, args=(self.tokens, key, char_widths), daemon=True
+            )
+            self.chunk_thread.start()
+
+    def compute_chunks(self, tokens, key, char_widths):
+        tokens.wait()
+        try:
+            starts = chunk_starts(tokens, TextWidths(char_widths))
+        except ValueError:
+            # The book was closed while it was being chunked
+            return
+        if tokens is self.tokens:
+            self.chunk_layouts[key] = starts
+            if key == self.chunk_key:
+                self.chunks = starts
+
+    def duration(self, start, end):
+        timing = self.timing
+        if self.natural_timing and timing is not None and end < len(timing):
+            return self.speed * (timing[end] - timing[start])
+        return self.speed
+
+    def segment_start(self, index):
+        if self.mode == "chunk" and self.chunks:
+            return self.chunks[bisect_right(self.chunks, index) - 1]
+        if self.mode == "sentence":
+            return self.tokens.sentence_bounds(index)[0]
+        if self.mode == "paragraph":
+            return self.tokens.paragraph_bounds(index)[0]
+        return index
+
+    def segment_end(self, index):
+        # End of the frame starting at index, from the segmentation index
+        if self.mode == "chunk" and self.chunks:
+            n = bisect_right(self.chunks, index)
+            return self.chunks[n] if n < len(self.chunks) else len(self.tokens)
+        if self.mode == "sentence":
+            return self.tokens.sentence_bounds(index)[1]
+        if self.mode == "paragraph":
+            return self.tokens.paragraph_bounds(index, limit=PARAGRAPH_WORD_LIMIT)[1]
+        return index + 1
+
+    def jump(self, index, unit, step):
+        # Word index to move to from index, a sentence, paragraph or chapter
+        # forward (step 1) or back (step -1). Going back from inside a
+        # segment returns to its start first, as a media player would.
+        starts = getattr(self.tokens, unit + "_starts", None)
+        if not starts:
+            return max(0, index + step)
+        n = bisect_right(starts, index) - 1
+        if step > 0:
+            return starts[n + 1] if n + 1 < len(starts) else index
+        if index > starts[n] + 1:
+            return starts[n]
+        return starts[max(0, n - 1)]
+
+    def frame_at(self, index):
+        end = self.segment_end(index)
+        if end - index == 1:
+            text = self.tokens[index]
+        else:
+            text = " ".join(self.tokens[index:end])
+        return Frame(text, index, end, self.duration(index, end))
+
+    def frames(self, index=0):
+        while index < len(self.tokens):
+            frame = self.frame_at(index)
+            yield frame
+            index = frame.end
+
+
+def orp_split(text):
+    # Splits a word around its optimal recognition point, ignoring leading
+    # and trailing punctuation: (before, pivot letter, after)
+    if not text:
+        return "", "", ""
+    start, end = 0, len(text)
+    while start < end and not text[start].isalnum():
+        start += 1
+    while end > start and not text[end - 1].isalnum():
+        end -= 1
+    if start == end:
+        start, end = 0, len(text)
+    pivot = start + int((end - start) * ORP_FRACTION)
+    return text[:pivot], text[pivot], text[pivot + 1:]
+
+
+def display_text(text, display_mode, font_size):
+    # Text and font size to show for a frame in the given display mode
+    if display_mode == "focus":
+        # Highlight the middle character
+        mid = len(text) // 2
+        return f"{text[:mid]}|{text[mid]}|{text[mid+1:]}", font_size
+    if display_mode == "dynamic":
+        # Adjust size based on word length
+        return text, max(20, min(60, 60 - len(text)))
+    return text, font_size
+
+
+def session_record(words_read, minutes, book=None):
+    # Stats entry for words_read words read over the given minutes
+    wpm = (words_read / minutes) if minutes > 0 else 0
+    return {
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "book": book,
+        "words_read": words_read,
+        "time": minutes,
+        "speed": wpm
+    }
+
+
+class ReadingSession:
+    # Words and active reading time for one book. Words are counted once per
+    # frame as it is shown, and time only runs between resume() and pause(),
+    # so seeking and pauses never count. checkpoint() returns the words and
+    # time since the previous checkpoint as a stats record, which keeps the
+    # journal at a few records per minute whatever the reading speed.
+    def __init__(self, book=None):
+        self.book = book
+        self.words = 0
+        self.active_time = 0.0
+        self.resumed_at = None
+        self.reported_words = 0
+        self.reported_time = 0.0
+        self.last_checkpoint = time.perf_counter()
+
+    def resume(self):
+        if self.resumed_at is None:
+            self.resumed_at = time.perf_counter()
+
+    def pause(self):
+        if self.resumed_at is not None:
+            self.active_time += time.perf_counter() - self.resumed_at
+            self.resumed_at = None
+
+    def count(self, words):
+        self.words += words
+
+    def elapsed(self):
+        # Seconds of active reading
+        if self.resumed_at is None:
+            return self.active_time
+        return self.active_time + time.perf_counter() - self.resumed_at
+
+    def checkpoint_due(self, interval):
+        return time.perf_counter() - self.last_checkpoint >= interval
+
+    def checkpoint(self):
+        self.last_checkpoint = time.perf_counter()
+        elapsed = self.elapsed()
+        words = self.words - self.reported_words
+        seconds = elapsed - self.reported_time
+        if not words and seconds < 1:
+            return None
+        self.reported_words = self.words
+        self.reported_time = elapsed
+        return session_record(words, seconds / 60, self.book)
@@ -0,0 +1,137 @@
+import json
+import time
+from array import array
+from collections import namedtuple
+
+TIMING_FRAMES = 2048  # Frames kept by FrameTimings
+
+# Returned by a tick that presented nothing, such as one polling for audio
+# or for the indexer; the scheduler calls back after delay seconds without
+# counting a frame
+Wait = namedtuple("Wait", "delay")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class FrameTimings:
+    # Ring buffer of the intended and actual presentation time, duration and
+    # word count of the most recent frames. Recording is a few array stores,
+    # cheap enough for every frame; summaries are computed on demand.
+    def __init__(self, size=TIMING_FRAMES):
+        self.size = size
+        self.intended = array("d", bytes(8 * size))
+        self.actual = array("d", bytes(8 * size))
+        self.durations = array("d", bytes(8 * size))
+        self.words = array("I", bytes(4 * size))
+        self.count = 0  # Frames recorded in total; the buffer keeps the last size
+        self.dropped = 0
+        self.pending_words = 0
+
+    def count_words(self, words):
+        # Words shown by the frame being presented
+        self.pending_words += words
+
+    def record(self, intended, actual, duration, dropped=False):
+        i = self.count % self.size
+        self.intended[i] = intended
+        self.actual[i] = actual
+        self.durations[i] = duration
+        self.words[i] = self.pending_words
+        self.pending_words = 0
+        self.count += 1
+        if dropped:
+            self.dropped += 1
+
+    def reset(self):
+        self.count = self.dropped = self.pending_words = 0
+
+    def frames(self):
+        # Recorded frames, oldest first
+        n = min(self.count, self.size)
+        start = self.count - n
+        for k in range(start, self.count):
+            i = k % self.size
+            yield self.intended[i], self.actual[i], self.durations[i], self.words[i]
+
+    def summary(self):
+        frames = list(self.frames())
+        lateness = sorted((actual - intended) * 1000 for intended, actual, _, _ in frames)
+        words = sum(f[3] for f in frames)
+        span = frames[-1][1] + frames[-1][2] - frames[0][1] if frames else 0
+        return {
+            "frames": self.count,
+            "dropped": self.dropped,
+            "jitter_p50_ms": percentile(lateness, 0.50),
+            "jitter_p95_ms": percentile(lateness, 0.95),
+            "jitter_p99_ms": percentile(lateness, 0.99),
+            "effective_wpm": words / span * 60 if span > 0 else 0,
+        }
+
+    def export(self, path, **details):
+        # Summary and raw frame timings as JSON, with any details passed in
+        # (font, display mode, target speed) to help diagnose slow setups
+        with open(path, "w") as f:
+            json.dump({
+                "details": details,
+                "summary": self.summary(),
+                "frames": [
+                    {"intended": intended, "actual": actual, "duration": duration, "words": words}
+                    for intended, actual, duration, words in self.frames()
+                ],
+            }, f, indent=1)
+
+
+class FrameScheduler:
+    # Presents frames from the Tk event loop against absolute deadlines.
+    # Each deadline is the previous deadline plus the frame duration, so the
+    # time spent rendering and updating stats never accumulates as drift.
+    def __init__(self, root, late_tolerance=0.004, max_lag=0.25, timings=None):
+        self.root = root
+        self.timings = timings  # Optional FrameTimings fed with every frame
+        self.late_tolerance = late_tolerance  # Seconds late before a frame counts as missed
+        self.max_lag = max_lag  # Resynchronise instead of bursting after a long stall
+        self.after_id = None
+        self.tick = None
+        self.deadline = 0.0
+
+    def start(self, tick):
+        # tick() presents one frame and returns its duration in seconds,
+        # a Wait when it presented nothing, or None when there is nothing
+        # left to show
+        self.stop()
+        self.tick = tick
+        self.deadline = time.perf_counter()
+        self.after_id = self.root.after_idle(self._fire)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    @property
+    def running(self):
+        return self.after_id is not None
+
+    def _fire(self):
+        self.after_id = None
+        now = time.perf_counter()
+        lateness = now - self.deadline
+        duration = self.tick()
+        if duration is None:
+            return
+        if isinstance(duration, Wait):
+            # Polls are not frames: they are neither recorded nor missed, and
+            # the next frame is due when the poll asked to be called back
+            self.deadline = now + duration.delay
+        else:
+            if self.timings:
+                self.timings.record(self.deadline, now, duration, lateness > self.late_tolerance)
+            if lateness > self.max_lag:
+                self.deadline = now
+            self.deadline += duration
+        delay = self.deadline - time.perf_counter()
+        self.after_id = self.root.after(max(0, int(delay * 1000)), self._fire)
@@ -0,0 +1,119 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+
+TERM_STRIP_RE = re.compile(r"^\W+|\W+$")
+MAX_HITS = 100
+
+
+def normalize(word):
+    return TERM_STRIP_RE.sub("", word.lower())
+
+
+def encode_positions(positions):
+    # Ascending word positions as varint-encoded gaps
+    out = bytearray()
+    previous = 0
+    for position in positions:
+        gap = position - previous
+        previous = position
+        while gap >= 0x80:
+            out.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def decode_positions(data):
+    positions = []
+    position = gap = shift = 0
+    for byte in data:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            position += gap
+            positions.append(position)
+            gap = shift = 0
+    return positions
+
+
+class SearchIndex:
+    # Inverted index from normalized term to the word positions where it
+    # occurs in each book. Positions are word indices into the book's
+    # TokenSource, so a hit can be opened directly at that word.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self.connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    positions BLOB NOT NULL,
+                    PRIMARY KEY (term, filename)
+                ) WITHOUT ROWID
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS postings_filename ON postings (filename)")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS indexed_books (
+                    filename TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def indexed_books(self):
+        with self.connect() as db:
+            return dict(db.execute("SELECT filename, hash FROM indexed_books"))
+
+    def add_book(self, filename, digest, tokens):
+        postings = {}
+        for position, word in enumerate(tokens):
+            term = normalize(word)
+            if term:
+                postings.setdefault(term, []).append(position)
+        rows = ((term, filename, encode_positions(positions)) for term, positions in postings.items())
+        with self.connect() as db:
+            db.execute("DELETE FROM postings WHERE filename = ?", (filename,))
+            db.executemany("INSERT INTO postings VALUES (?, ?, ?)", rows)
+            db.execute("INSERT OR REPLACE INTO indexed_books VALUES (?, ?)", (filename, digest))
+
+    def remove_book(self, filename):
+        with self.connect() as db:
+            db.execute("DELETE FROM postings WHERE filename = ?", (filename,))
+            db.execute("DELETE FROM indexed_books WHERE filename = ?", (filename,))
+
+    def search(self, phrase, limit=MAX_HITS):
+        # Returns (filename, position) pairs where the whole phrase occurs
+        terms = [term for term in (normalize(word) for word in phrase.split()) if term]
+        if not terms:
+            return []
+        with self.connect() as db:
+            per_term = []
+            for term in terms:
+                rows = db.execute("SELECT filename, positions FROM postings WHERE term = ?", (term,))
+                per_term.append(dict(rows.fetchall()))
+
+        # Start from the rarest term and check the others at their offsets
+        books = set(per_term[0]).intersection(*per_term[1:])
+        hits = []
+        for filename in sorted(books):
+            rarest = min(range(len(terms)), key=lambda k: len(per_term[k][filename]))
+            others = [
+                (k - rarest, set(decode_positions(per_term[k][filename])))
+                for k in range(len(terms)) if k != rarest
+            ]
+            for position in decode_positions(per_term[rarest][filename]):
+                if all(position + offset in positions for offset, positions in others):
+                    hits.append((filename, position - rarest))
+                    if len(hits) >= limit:
+                        return hits
+        return hits
@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import re
+from functools import lru_cache
+
+WORDLIST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "wordlists")
+CHINESE_WORDLIST = os.path.join(WORDLIST_DIR, "zh_words.txt")
+PHRASE_MODEL = os.path.join(WORDLIST_DIR, "budoux_{}.json")
+DETECT_BYTES = 1 << 16  # Bytes sampled from the start of a book
+UNSPACED_SHARE = 0.3  # Share of CJK or Thai characters that makes a text unspaced
+KANA_SHARE = 0.05  # Share of kana among CJK characters that makes a text Japanese
+
+# Punctuation that stays with the word before it, or the word after it
+CLOSING_PUNCTUATION = frozenset("。，、；：！？」』）》〉】〕…‥・”’!),.:;?！），．：；？")
+OPENING_PUNCTUATION = frozenset("「『（《〈【〔“‘(（")
+# Characters found in traditional but not simplified Chinese, and their
+# simplified forms
+TRADITIONAL_CHARS = frozenset("們這個說為會來時對經過還後開關學國實點長發現問題將給從裡麼樣東車見進動區")
+SIMPLIFIED_CHARS = frozenset("们这个说为会来时对经过还后开关学国实点长发现问题将给从里么样东车见进动区")
+# Outside unspaced scripts, words also break at spaces other than ASCII
+# ones, at zero-width spaces, and after a dash or ellipsis joining two words
+BREAKING_SPACES = frozenset("\u200b")
+BREAK_AFTER = frozenset("\u2014\u2015\u2026")  # Em dash, horizontal bar, ellipsis
+# UTF-8 of those characters: a chunk of text without any has nothing for
+# UnicodeSegmenter to split
+UNICODE_BREAK_RE = re.compile(
+    rb"\xc2\xa0|\xe1\x9a\x80|\xe2\x80[\x80-\x8b\x94\x95\xa6\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80"
+)
+NON_ASCII_RE = re.compile(rb"[\x80-\xff]")
+
+
+def is_cjk(char):
+    # Kana, ideographs and the CJK blocks between them, which are written
+    # without spaces between words
+    return ("\u3040" <= char <= "\u9fff" or "\uf900" <= char <= "\ufaff" or
+            "\uff66" <= char <= "\uff9f" or "\U00020000" <= char <= "\U0002fa1f")
+
+
+def is_kana(char):
+    return "\u3040" <= char <= "\u30ff" or "\uff66" <= char <= "\uff9f"
+
+
+def is_thai(char):
+    return "\u0e00" <= char <= "\u0e7f"
+
+
+class Segmenter:
+    # Splits the tokens found between ASCII spaces into words. A segmenter
+    # is called with a buffer and the byte range of one token, and returns
+    # the byte spans of its words. Runs of the characters a subclass handles
+    # (in_run) go to its split_run; anything else breaks at Unicode spaces
+    # and after dashes, with ASCII punctuation kept in its word. Punctuation
+    # standing on its own stays with the word before or after it.
+    # TokenSource only calls a segmenter on chunks of text that `pattern`
+    # matches somewhere, as the rest can have nothing to split.
+    pattern = UNICODE_BREAK_RE
+
+    def in_run(self, char):
+        return False
+
+    def split_run(self, text, start, stop):
+        return [[start, stop]]
+
+    def __call__(self, data, start, stop):
+        token = data[start:stop]
+        if token.isascii():
+            return ((start, stop),)
+        # Undecodable bytes become one surrogate each, so lengths map back
+        text = token.decode("utf-8", errors="surrogateescape")
+        if len(token) == 3 * len(text):
+            # Every character takes three bytes, as in most CJK text
+            return [(start + 3 * first, start + 3 * last) for first, last in self.split(text)]
+        spans = []
+        position = start
+        previous = 0
+        for first, last in self.split(text):
+            position += len(text[previous:first].encode("utf-8", errors="surrogateescape"))
+            end = position + len(text[first:last].encode("utf-8", errors="surrogateescape"))
+            spans.append((position, end))
+            position, previous = end, last
+        return spans
+
+    def split(self, text):
+        # (start, end) character ranges of the words in text
+        in_run = self.in_run
+        segments = []
+        size = len(text)
+        i = 0
+        while i < size:
+            char = text[i]
+            if char.isspace() or char in BREAKING_SPACES:
+                i += 1
+                continue
+            end = i + 1
+            if in_run(char):
+                while end < size and in_run(text[end]):
+                    end += 1
+                segments.extend(self.split_run(text, i, end))
+            else:
+                while end < size:
+                    char = text[end]
+                    if (char.isspace() or char in BREAKING_SPACES or in_run(char) or
+                            not char.isascii() and (char in CLOSING_PUNCTUATION or char in OPENING_PUNCTUATION)):
+                        break
+                    if text[end - 1] in BREAK_AFTER and char not in BREAK_AFTER and char.isalnum():
+                        break
+                    end += 1
+                segments.append([i, end])
+            i = end
+        return attach_punctuation(text, segments)
+
+
+def attach_punctuation(text, segments):
+    # Joins segments made only of punctuation to the word they touch:
+    # closing marks to the one before, opening marks to the one after
+    joined = []
+    opened = None  # Opening punctuation waiting for its word
+    for segment in segments:
+        first, last = segment
+        piece = text[first:last]
+        if opened is not None and opened[1] != first:
+            joined.append(opened)
+            opened = None
+        # Most segments are words, ruled out by their first character
+        if (piece[0] in CLOSING_PUNCTUATION and joined and joined[-1][1] == first and opened is None and
+                all(char in CLOSING_PUNCTUATION for char in piece)):
+            joined[-1][1] = last
+        elif piece[0] in OPENING_PUNCTUATION and all(char in OPENING_PUNCTUATION for char in piece):
+            if opened is None:
+                opened = segment
+            else:
+                opened[1] = last
+        else:
+            if opened is not None:
+                segment[0] = opened[0]
+                opened = None
+            joined.append(segment)
+    if opened is not None:
+        joined.append(opened)
+    return joined
+
+
+class UnicodeSegmenter(Segmenter):
+    # Word breaking for spaced scripts: only splits at non-ASCII spaces and
+    # after dashes, which ASCII whitespace tokenization misses
+    pass
+
+
+class DictionarySegmenter(Segmenter):
+    # Splits unspaced Chinese into words with a word list and word counts,
+    # choosing the most probable split of each run of CJK characters: every
+    # word the dictionary knows at each position is a candidate, and the
+    # path of candidates whose costs (negative log frequencies) add up to
+    # the least wins, found by dynamic programming from the end of the run.
+    # The dictionary is two hash sets, the words with their costs and all
+    # of their proper prefixes, so the words starting at a position are
+    # found by walking forward one character at a time, as down a trie,
+    # until the text is no longer a prefix of any word. Characters the
+    # dictionary lacks stand alone at the cost of a word seen once.
+    pattern = NON_ASCII_RE
+
+    def __init__(self, counts):
+        total = sum(counts.values()) or 1
+        self.costs = {word: math.log(total / count) for word, count in counts.items() if count > 0}
+        self.prefixes = frozenset(word[:n] for word in self.costs for n in range(1, len(word)))
+        self.unknown = math.log(total)
+
+    @classmethod
+    def from_file(cls, path):
+        # Lines of "word count"
+        counts = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1].isdigit():
+                        counts[parts[0]] = int(parts[1])
+        except OSError:
+            pass
+        return cls(counts)
+
+    def in_run(self, char):
+        return "\u3040" <= char <= "\u9fff" or is_cjk(char)
+
+    def split_run(self, text, start, stop):
+        costs, prefixes, unknown = self.costs, self.prefixes, self.unknown
+        size = stop - start
+        best = [0.0] * (size + 1)  # Least cost of the text from each position on
+        ends = [0] * size  # End of the first word on that path
+        for i in range(stop - 1, start - 1, -1):
+            char = text[i]
+            n = i - start
+            cost = costs.get(char, unknown) + best[n + 1]
+            end = i + 1
+            if char in prefixes:
+                k = i + 2
+                while k <= stop:
+                    piece = text[i:k]
+                    word = costs.get(piece)
+                    if word is not None and word + best[k - start] < cost:
+                        cost = word + best[k - start]
+                        end = k
+                    if piece not in prefixes:
+                        break
+                    k += 1
+            best[n] = cost
+            ends[n] = end
+        segments = []
+        i = start
+        while i < stop:
+            end = ends[i - start]
+            segments.append([i, end])
+            i = end
+        return segments
+
+
+class PhraseSegmenter(Segmenter):
+    # Splits unspaced text into short phrases, such as a Japanese word with
+    # its particles, with a BudouX model (https://github.com/google/budoux):
+    # weights for the characters, pairs and triples around each position
+    # are summed, and a positive total starts a new phrase there. Phrases
+    # read better than single morphemes in RSVP, and the models are small.
+    # Everything between spaces goes through the model, punctuation and
+    # embedded Latin words included, as it was trained on such text.
+    pattern = NON_ASCII_RE
+
+    def __init__(self, model):
+        self.model = [model.get(name, {}) for name in (
+            "UW1", "UW2", "UW3", "UW4", "UW5", "UW6", "BW1", "BW2", "BW3", "TW1", "TW2", "TW3", "TW4"
+        )]
+        self.base_score = -sum(sum(weights.values()) for weights in model.values()) * 0.5
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError):
+            return cls({})
+
+    def in_run(self, char):
+        return not char.isspace() and char not in BREAKING_SPACES
+
+    def split_run(self, text, start, stop):
+        uw1, uw2, uw3, uw4, uw5, uw6, bw1, bw2, bw3, tw1, tw2, tw3, tw4 = self.model
+        base = self.base_score
+        segments = [[start, start + 1]]
+        for i in range(start + 1, stop):
+            score = base + uw3.get(text[i - 1], 0) + uw4.get(text[i], 0) + bw2.get(text[i - 1:i + 1], 0)
+            if i - start > 1:
+                score += uw2.get(text[i - 2], 0) + bw1.get(text[i - 2:i], 0) + tw2.get(text[i - 2:i + 1], 0)
+                if i - start > 2:
+                    score += uw1.get(text[i - 3], 0) + tw1.get(text[i - 3:i], 0)
+            if i + 1 < stop:
+                score += uw5.get(text[i + 1], 0) + bw3.get(text[i:i + 2], 0) + tw3.get(text[i - 1:i + 2], 0)
+                if i + 2 < stop:
+                    score += uw6.get(text[i + 2], 0) + tw4.get(text[i:i + 3], 0)
+            if score > 0:
+                segments.append([i, i + 1])
+            else:
+                segments[-1][1] = i + 1
+        return segments
+
+
+# Segmenters by name. Each entry builds the segmenter once per process;
+# TokenSource looks them up by name, so worker processes can too.
+SEGMENTERS = {
+    "zh": lambda: DictionarySegmenter.from_file(CHINESE_WORDLIST),
+    "zh-hant": lambda: PhraseSegmenter.from_file(PHRASE_MODEL.format("zh-hant")),
+    "ja": lambda: PhraseSegmenter.from_file(PHRASE_MODEL.format("ja")),
+    "th": lambda: PhraseSegmenter.from_file(PHRASE_MODEL.format("th")),
+    "unicode": UnicodeSegmenter,
+}
+
+
+@lru_cache(maxsize=None)
+def get_segmenter(name):
+    return SEGMENTERS[name]() if name else None
+
+
+def detect_segmenter(data):
+    # Name of the segmenter a text needs, from a sample of its start, or
+    # None for plain ASCII text, which spaces split into words on their own
+    sample = bytes(data[:DETECT_BYTES]).decode("utf-8", errors="ignore")
+    if sample.isascii():
+        return None
+    letters = [char for char in sample if not char.isspace()]
+    cjk = [char for char in letters if is_cjk(char)]
+    if len(cjk) >= UNSPACED_SHARE * len(letters):
+        if sum(1 for char in cjk if is_kana(char)) >= KANA_SHARE * len(cjk):
+            return "ja"
+        traditional = sum(1 for char in cjk if char in TRADITIONAL_CHARS)
+        simplified = sum(1 for char in cjk if char in SIMPLIFIED_CHARS)
+        return "zh-hant" if traditional > simplified else "zh"
+    if sum(1 for char in letters if is_thai(char)) >= UNSPACED_SHARE * len(letters):
+        return "th"
+    return "unicode"
@@ -0,0 +1,388 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+CHUNK_WORD_LIMIT = 40  # Longest sentence synthesized as one chunk
+AHEAD = 3  # Chunks synthesized ahead of the one playing
+AUDIO_CACHE_BYTES = 256 * 1024 * 1024
+
+# Words [start, end) of the book spoken as one audio buffer
+Chunk = namedtuple("Chunk", "start end text")
+# When a chunk started playing, how long it lasts and how long it took to
+# synthesize, plus each word's start time within it as a fraction of the
+# duration
+ChunkTiming = namedtuple("ChunkTiming", "chunk started_at duration synth_time word_starts")
+
+
+def wav_duration(data):
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+
+def word_starts(words):
+    # Spoken time is roughly proportional to the letters in each word
+    weights = [len(word) + 1 for word in words]
+    total = float(sum(weights)) or 1.0
+    starts = []
+    elapsed = 0
+    for weight in weights:
+        starts.append(elapsed / total)
+        elapsed += weight
+    return starts
+
+
+def chunk_at(tokens, start):
+    # One sentence from word start, or a single word for plain lists
+    if hasattr(tokens, "sentence_bounds"):
+        end = tokens.sentence_bounds(start)[1]
+    else:
+        end = start + 1
+    end = min(max(end, start + 1), start + CHUNK_WORD_LIMIT)
+    return Chunk(start, end, " ".join(tokens[start:end]))
+
+
+class AudioCache:
+    # Synthesized audio on disk, one WAV file per (text hash, voice, rate).
+    # Reading a file marks it as recently used, and the least recently used
+    # files are evicted once the cache grows beyond max_bytes.
+    def __init__(self, cache_dir, max_bytes=AUDIO_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total = sum(size for _, size, _ in self.entries())
+
+    def path(self, text, voice, rate):
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        voice_hash = hashlib.sha1(str(voice).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{text_hash}-{voice_hash}-{rate}.wav")
+
+    def get(self, text, voice, rate):
+        path = self.path(text, voice, rate)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def contains(self, text, voice, rate):
+        return os.path.exists(self.path(text, voice, rate))
+
+    def put(self, text, voice, rate, data):
+        path = self.path(text, voice, rate)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            self.remove(tmp_path)
+            return
+        with self.lock:
+            self.total += len(data)
+            if self.total > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".wav"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        self.total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.total <= self.max_bytes:
+                break
+            self.remove(path)
+            self.total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CachedBackend:
+    # Wraps a backend with an AudioCache, so text already spoken with the
+    # same voice and rate is read back from disk instead of synthesized.
+    # The owner keeps voice and rate in step with the speech engine.
+    def __init__(self, backend, cache, voice=None, rate=None):
+        self.backend = backend
+        self.cache = cache
+        self.voice = voice
+        self.rate = rate
+        self.workers = getattr(backend, "workers", 1)
+
+    def cached(self, text):
+        return self.cache.contains(text, self.voice, self.rate)
+
+    def synthesize(self, text):
+        voice, rate = self.voice, self.rate
+        data = self.cache.get(text, voice, rate)
+        if data is None:
+            data = self.backend.synthesize(text)
+            # Audio from a synthesis the voice or rate changed under may
+            # be in either, so it is not cached
+            if (self.voice, self.rate) == (voice, rate):
+                self.cache.put(text, voice, rate, data)
+        return data
+
+
+class Pyttsx3Backend:
+    # Synthesizes speech to WAV bytes with pyttsx3's save_to_file. pyttsx3
+    # shares one engine per process, so it is used by one worker at a time,
+    # and property changes are queued and made under the same lock.
+    workers = 1
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()  # Held while the engine is in use
+        self.properties = {}  # Changes waiting for the engine
+        self.properties_lock = threading.Lock()
+
+    def set_property(self, name, value):
+        # Applied before the next synthesis, so the caller (the Tk thread)
+        # never waits for one in progress
+        with self.properties_lock:
+            self.properties[name] = value
+
+    def synthesize(self, text):
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self.lock:
+                with self.properties_lock:
+                    properties, self.properties = self.properties, {}
+                for name, value in properties.items():
+                    self.engine.setProperty(name, value)
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+class WavPlayer:
+    # Plays WAV bytes and blocks until done or until stopped, the stop event
+    # of the run playing them, is set: winsound plays from memory on Windows,
+    # elsewhere the buffer goes through aplay or afplay. Without any player
+    # the audio is skipped but its duration is still waited out.
+    def __init__(self):
+        self.process = None
+        self.lock = threading.Lock()
+        self.command = shutil.which("afplay") or shutil.which("aplay")
+
+    def play(self, data, duration, stopped):
+        if sys.platform == "win32":
+            import winsound
+            if not stopped.is_set():
+                winsound.PlaySound(data, winsound.SND_MEMORY)
+        elif self.command:
+            fd, path = tempfile.mkstemp(suffix=".wav")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            try:
+                # Started under the lock, so stop() either sees the process
+                # or the run sees its stop event first
+                with self.lock:
+                    if stopped.is_set():
+                        return
+                    process = self.process = subprocess.Popen(
+                        [self.command, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                    )
+                process.wait()
+            finally:
+                with self.lock:
+                    self.process = None
+                os.remove(path)
+        else:
+            stopped.wait(duration)
+
+    def stop(self):
+        if sys.platform == "win32":
+            import winsound
+            winsound.PlaySound(None, 0)
+        with self.lock:
+            process = self.process
+        if process:
+            process.terminate()
+
+
+class SpeechPipeline:
+    # Speaks a book sentence by sentence. Upcoming chunks are synthesized to
+    # in-memory WAV buffers by a worker pool while the current one plays, and
+    # each chunk's start time and duration are published in `playing`, so the
+    # display can follow the audio with time_until() instead of guessing.
+    # stop() never waits for the playing thread, which is usually blocked on
+    # a synthesis: each run has its own queue and stop event, and checks the
+    # event under self.lock before touching shared state or playing audio.
+    def __init__(self, backend, player=None, ahead=AHEAD):
+        self.backend = backend
+        self.player = player or WavPlayer()
+        self.ahead = ahead
+        self.pool = ThreadPoolExecutor(max_workers=getattr(backend, "workers", 1))
+        self.queue = deque()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.playing = None  # ChunkTiming of the chunk being played
+        self.timings = deque(maxlen=100)  # Recently played chunks
+        self.tokens = None
+        self.next_start = 0
+        self.prewarm_thread = None
+        self.prewarm_stopped = threading.Event()
+
+    def start(self, tokens, index):
+        self.stop()
+        with self.lock:
+            self.tokens = tokens
+            self.next_start = index
+            # Each run gets its own queue and stop flag, so a stopped run that
+            # is still waiting on a synthesis can never touch the next one
+            self.stopped = threading.Event()
+            self.queue = deque()
+            for _ in range(self.ahead + 1):
+                self.submit_next(self.queue)
+            self.thread = threading.Thread(target=self.play_loop, args=(self.queue, self.stopped), daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        # Returns at once; the stopped run ends by itself
+        with self.lock:
+            self.stopped.set()
+            for _, future in self.queue:
+                future.cancel()
+            self.thread = None
+            self.playing = None
+        self.player.stop()
+
+    @property
+    def active(self):
+        return self.thread is not None and self.thread.is_alive() and not self.stopped.is_set()
+
+    def next_chunk(self):
+        if self.next_start >= len(self.tokens):
+            return None
+        chunk = chunk_at(self.tokens, self.next_start)
+        self.next_start = chunk.end
+        return chunk
+
+    def submit_next(self, queue):
+        chunk = self.next_chunk()
+        if chunk is not None:
+            queue.append((chunk, self.pool.submit(self.synthesize, chunk)))
+
+    def synthesize(self, chunk):
+        started = time.perf_counter()
+        data = self.backend.synthesize(chunk.text)
+        return data, time.perf_counter() - started
+
+    def play_loop(self, queue, stopped):
+        while not stopped.is_set() and queue:
+            chunk, future = queue.popleft()
+            try:
+                data, synth_time = future.result()
+            except CancelledError:
+                return
+            except (OSError, RuntimeError):
+                # A chunk that fails to synthesize is skipped
+                continue
+            with self.lock:
+                if stopped.is_set():
+                    return
+                try:
+                    self.submit_next(queue)
+                except (ValueError, RuntimeError):
+                    # The book, or the pipeline, was closed under the run
+                    return
+                words = chunk.text.split()
+                duration = wav_duration(data) or 0.4 * len(words)
+                self.playing = ChunkTiming(chunk, time.perf_counter(), duration, synth_time, word_starts(words))
+                self.timings.append(self.playing)
+            self.player.play(data, duration, stopped)
+        with self.lock:
+            if not stopped.is_set():
+                self.playing = None
+
+    def prewarm(self, tokens, start, end):
+        # Synthesizes the chunks of words [start, end) into the backend's
+        # cache on a background thread, skipping those already cached, so
+        # they play without waiting later. Only one pre-warm runs at a time.
+        if not hasattr(self.backend, "cached"):
+            return
+        self.cancel_prewarm()
+        self.prewarm_stopped = threading.Event()
+        self.prewarm_thread = threading.Thread(
+            target=self.prewarm_loop, args=(tokens, start, end, self.prewarm_stopped), daemon=True
+        )
+        self.prewarm_thread.start()
+
+    def prewarm_loop(self, tokens, start, end, stopped):
+        end = min(end, len(tokens))
+        while start < end and not stopped.is_set():
+            try:
+                chunk = chunk_at(tokens, start)
+            except ValueError:
+                # The book was closed
+                return
+            start = chunk.end
+            if self.backend.cached(chunk.text):
+                continue
+            try:
+                self.backend.synthesize(chunk.text)
+            except (OSError, RuntimeError):
+                continue
+
+    def cancel_prewarm(self):
+        self.prewarm_stopped.set()
+
+    @property
+    def prewarming(self):
+        thread = self.prewarm_thread
+        return thread is not None and thread.is_alive() and not self.prewarm_stopped.is_set()
+
+    def time_until(self, index):
+        # Seconds until word index is spoken, negative once it has been, or
+        # None when no playing chunk covers it yet
+        playing = self.playing
+        if playing is None:
+            return None
+        chunk = playing.chunk
+        if index < chunk.start:
+            return -1.0
+        if index > chunk.end:
+            return None
+        if index == chunk.end:
+            offset = 1.0
+        else:
+            offset = playing.word_starts[index - chunk.start]
+        return playing.started_at + offset * playing.duration - time.perf_counter()
+
+    def close(self):
+        self.cancel_prewarm()
+        self.stop()
+        self.pool.shutdown(wait=False)
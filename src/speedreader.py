@@ -1,33 +1,68 @@
+import time
+STARTUP_START = time.perf_counter()  # Reference point for time-to-first-frame
 import customtkinter as ctk
 from tkinter import filedialog, Toplevel, Listbox, Scale, ttk, colorchooser
 import threading
-import time
 import os
-import shutil
+import sys
+import argparse
 import json
+import queue
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import pyttsx3
+from stats_store import StatsStore
+from scheduler import FrameScheduler, FrameTimings, Wait
+from tokens import TokenSource
+from book_cache import BookCache
+from library import LibraryCatalog, SORT_ORDERS
+from text_filters import FILTER_LABELS, filter_key
+from search_index import SearchIndex
+from bookmarks import BookmarkStore
+from rsvp import ReadingSession, RSVPEngine
+from timing import load_wordlist
+from render_cache import LOOKAHEAD, OrpView, RenderCache
+from speech import AudioCache, CachedBackend, Pyttsx3Backend, SpeechPipeline
+import ingest
+from batch_import import BatchImport, find_books
+
+SPEECH_POLL = 0.02  # Seconds between checks while the display waits for audio
+FILTER_POLL_MS = 250  # Between checks for a book's filtered text being ready
+SEEK_POLL_MS = 100  # Between checks for indexing to reach a pending jump
+PREWARM_SENTENCES = 20  # Sentences synthesized into the audio cache ahead of speech
+STATS_CHECKPOINT = 5.0  # Seconds of reading per stats record
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class SpeedReader:
     def __init__(self, root):
         self.root = root
         self.root.title("Speed Reader Pro")
         self.root.geometry("1000x700")
-        
-        # Initialize text-to-speech engine
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', 150)  # Default speech rate
+        # Intended and actual time of recent frames, for the stats overlay
+        self.frame_timings = FrameTimings()
+        self.scheduler = FrameScheduler(self.root, timings=self.frame_timings)
+        
+        # Text-to-speech engine is created in the background once the window
+        # is up, or on first use, so it never delays startup
+        self.engine = None
+        self.engine_ready = threading.Event()
+        self.engine_thread = None
+        self.speech_rate = 150  # Default speech rate
         self.speech_enabled = False
-        self.speech_thread = None
-        
-        # Get available voices
-        self.voices = self.engine.getProperty('voices')
+        self.speech = None  # Pipeline that synthesizes ahead and plays in order
+        self.speech_backend = None  # Synthesis through the on-disk audio cache
+        self.import_executor = None  # Worker processes that convert imported books
+        self.batch_import = None
+        self.voices = []
         self.current_voice = 0  # Default to first voice
+        self.voice_id = None  # Voice the engine speaks with, for the audio cache
+        self.english_voices = [0]
         
-        # Filter for English voices
-        self.english_voices = [i for i, voice in enumerate(self.voices) if "english" in voice.name.lower()]
-        if not self.english_voices:
-            self.english_voices = [0]  # Fallback to first voice if no English voices found
+        # Called with the time-to-first-frame in seconds
+        self.startup_time = None
+        self.startup_hooks = []
+        if os.environ.get("SPEEDREADER_STARTUP_TIMING"):
+            self.startup_hooks.append(lambda t: print(f"Time to first frame: {t * 1000:.0f} ms"))
         
         # Theme configurations
         self.themes = {
@@ -71,19 +106,24 @@ class SpeedReader:
         # Initialize variables
         self.text = []
         self.index = 0
+        # Jump waiting for the background indexer to reach its target, as
+        # (text, word index, byte offset), and the event loop check for it
+        self.pending_seek = None
+        self.seek_poll = None
+        self.position_conversions = {}  # Threads converting old word positions, by book
+        self.converted_bookmark = None  # Bookmark jumped to once its book's positions are converted
         self.running = False
         self.speed = 0.09
         self.font_size = 42
         self.current_book = None
-        self.bookmarks = []
-        self.reading_stats = {
-            "total_words_read": 0,
-            "total_time": 0,
-            "average_speed": 0,
-            "sessions": []
-        }
-        self.reading_mode = "word"  # word, sentence, or paragraph
-        self.display_mode = "standard"  # standard, focus, or dynamic
+        self.bookmarks = None
+        self.stats_store = None
+        self.reading_stats = {}
+        self.session = ReadingSession()
+        self.reading_mode = "word"  # word, chunk, sentence, or paragraph
+        self.rsvp = RSVPEngine(self.text, self.reading_mode, self.speed)
+        self.natural_timing = True
+        self.display_mode = "standard"  # standard, focus, dynamic, or orp
         self.auto_scroll = False
         self.show_progress = True
         self.show_stats_overlay = False
@@ -99,13 +139,26 @@ class SpeedReader:
         }
         
         # Create data directories if they don't exist
-        self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.base_dir = BASE_DIR
         self.books_dir = os.path.join(self.base_dir, "data", "books")
         self.stats_dir = os.path.join(self.base_dir, "data", "stats")
+        self.cache_dir = os.path.join(self.base_dir, "data", "cache")
         os.makedirs(self.books_dir, exist_ok=True)
         os.makedirs(self.stats_dir, exist_ok=True)
+        # Large books are tokenized on every core the first time they are opened
+        self.book_cache = BookCache(self.cache_dir, workers=os.cpu_count() or 1)
+        # Words outside this list are shown slightly longer
+        self.rsvp.common_words = load_wordlist(
+            os.path.join(self.base_dir, "data", "wordlists", "common_en.txt")
+        )
+        self.search_index = SearchIndex(os.path.join(self.base_dir, "data", "search.db"))
+        self.catalog = LibraryCatalog(
+            os.path.join(self.base_dir, "data", "library.db"), self.books_dir, self.book_cache,
+            self.search_index
+        )
         
         # Load saved data
+        self.stats_store = StatsStore(self.stats_dir)
         self.load_stats()
         self.load_bookmarks()
         self.load_theme_preferences()
@@ -154,6 +207,15 @@ class SpeedReader:
             wraplength=800
         )
         self.label.pack(pady=20)
+        # ORP display mode swaps the label for a canvas with a fixed pivot
+        theme = self.themes.get(self.current_theme, self.themes["dark"])
+        self.orp_view = OrpView(
+            self.main_container, height=120, wraplength=800,
+            bg=theme["bg"], fg=theme["fg"], highlight=self.highlight_color
+        )
+        self.render_cache = RenderCache(self.label, max_width=800, orp_view=self.orp_view)
+        self.prefetched_to = 0
+        self.prefetch_key = None
         
         # Control panel
         self.control_frame = ctk.CTkFrame(self.main_container)
@@ -197,6 +259,7 @@ class SpeedReader:
         self.mode_var = ctk.StringVar(value="word")
         modes = [
             ("Word", "word"),
+            ("Chunk", "chunk"),
             ("Sentence", "sentence"),
             ("Paragraph", "paragraph")
         ]
@@ -222,7 +285,7 @@ class SpeedReader:
         self.display_var = ctk.StringVar(value="standard")
         self.display_menu = ctk.CTkOptionMenu(
             self.display_frame,
-            values=["Standard", "Focus", "Dynamic"],
+            values=["Standard", "Focus", "Dynamic", "ORP"],
             variable=self.display_var,
             command=self.update_display_mode,
             width=120
@@ -280,6 +343,16 @@ class SpeedReader:
         )
         self.speech_cb.pack(side="left", padx=10)
         
+        # Per-word timing by length, punctuation and word rarity
+        self.natural_timing_var = ctk.BooleanVar(value=True)
+        self.natural_timing_cb = ctk.CTkCheckBox(
+            self.options_frame,
+            text="Natural Timing",
+            variable=self.natural_timing_var,
+            command=self.toggle_natural_timing
+        )
+        self.natural_timing_cb.pack(side="left", padx=10)
+        
         # Speech rate control
         self.speech_rate_label = ctk.CTkLabel(self.control_frame, text="Speech Rate:")
         self.speech_rate_label.pack()
@@ -301,18 +374,27 @@ class SpeedReader:
         self.voice_label = ctk.CTkLabel(self.voice_frame, text="Voice:")
         self.voice_label.pack(side="left", padx=5)
         
-        # Create voice names list
-        voice_names = [voice.name for voice in self.voices]
-        self.voice_var = ctk.StringVar(value=voice_names[0])
+        # Filled in once the speech engine has listed its voices
+        self.voice_var = ctk.StringVar(value="Loading voices...")
         self.voice_menu = ctk.CTkOptionMenu(
             self.voice_frame,
-            values=voice_names,
+            values=["Loading voices..."],
             variable=self.voice_var,
             command=self.update_voice,
+            state="disabled",
             width=200
         )
         self.voice_menu.pack(side="left", padx=5)
         
+        # Synthesize the current chapter ahead into the audio cache
+        self.prewarm_button = ctk.CTkButton(
+            self.voice_frame,
+            text="Pre-warm Chapter",
+            command=self.prewarm_chapter,
+            width=140
+        )
+        self.prewarm_button.pack(side="left", padx=5)
+        
         # Progress bar
         self.progress = ctk.CTkProgressBar(self.main_container)
         self.progress.set(0)
@@ -337,6 +419,14 @@ class SpeedReader:
         )
         self.import_button.pack(side="left", padx=10)
         
+        self.import_folder_button = ctk.CTkButton(
+            self.button_frame,
+            text="Import Folder",
+            command=self.import_folder,
+            **button_style
+        )
+        self.import_folder_button.pack(side="left", padx=10)
+        
         self.library_button = ctk.CTkButton(
             self.button_frame,
             text="Library",
@@ -345,6 +435,14 @@ class SpeedReader:
         )
         self.library_button.pack(side="left", padx=10)
         
+        self.contents_button = ctk.CTkButton(
+            self.button_frame,
+            text="Contents",
+            command=self.open_contents,
+            **button_style
+        )
+        self.contents_button.pack(side="left", padx=10)
+        
         self.restart_button = ctk.CTkButton(
             self.button_frame,
             text="Restart",
@@ -369,6 +467,85 @@ class SpeedReader:
         self.root.bind("<Escape>", lambda e: self.stop())
         self.root.bind("<Left>", lambda e: self.change_word(-1))
         self.root.bind("<Right>", lambda e: self.change_word(1))
+        self.root.bind("<Control-Left>", lambda e: self.jump("sentence", -1))
+        self.root.bind("<Control-Right>", lambda e: self.jump("sentence", 1))
+        self.root.bind("<Up>", lambda e: self.jump("paragraph", -1))
+        self.root.bind("<Down>", lambda e: self.jump("paragraph", 1))
+        self.root.bind("<Prior>", lambda e: self.jump("chapter", -1))
+        self.root.bind("<Next>", lambda e: self.jump("chapter", 1))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.root.after_idle(self.on_first_frame)
+        
+    def on_first_frame(self):
+        self.root.update_idletasks()
+        self.startup_time = time.perf_counter() - STARTUP_START
+        for hook in self.startup_hooks:
+            hook(self.startup_time)
+        self.load_engine()
+        self.catalog.refresh_async()
+        
+    def load_engine(self):
+        if self.engine_thread is None:
+            self.engine_thread = threading.Thread(target=self.init_engine, daemon=True)
+            self.engine_thread.start()
+            self.root.after(100, self.poll_engine)
+            
+    def init_engine(self):
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self.speech_rate)
+            voices = engine.getProperty('voices')
+            # The engine's default until a voice is picked
+            self.voice_id = engine.getProperty('voice')
+            
+            # Filter for English voices
+            english_voices = [i for i, voice in enumerate(voices) if "english" in voice.name.lower()]
+            self.english_voices = english_voices or [0]  # Fallback to first voice if no English voices found
+            self.voices = voices
+            self.engine = engine
+        finally:
+            self.engine_ready.set()
+            
+    def poll_engine(self):
+        # Voice menu is filled from the UI thread once the engine is ready
+        if not self.engine_ready.is_set():
+            self.root.after(100, self.poll_engine)
+            return
+        voice_names = [voice.name for voice in self.voices]
+        if voice_names:
+            self.voice_menu.configure(values=voice_names, state="normal")
+            self.voice_var.set(voice_names[self.current_voice])
+        else:
+            self.voice_var.set("No voices available")
+            
+    def ensure_engine(self):
+        self.load_engine()
+        self.engine_ready.wait()
+        return self.engine is not None
+        
+    def on_close(self):
+        self.running = False
+        self.scheduler.stop()
+        if self.speech:
+            self.speech.close()
+        if self.import_executor:
+            self.import_executor.shutdown(wait=False)
+        if self.batch_import:
+            self.batch_import.cancel()
+        self.save_stats()
+        self.stats_store.flush()  # Everything recorded is on disk before exit
+        self.save_position()
+        self.root.destroy()
+        
+    def save_position(self):
+        # Saved as a byte offset in the book file, which stays valid when
+        # the book's text filters change
+        if isinstance(self.text, TokenSource) and self.current_book:
+            offset = self.current_offset()
+            if offset is not None:
+                self.catalog.set_position(self.current_book, offset)
         
     def apply_theme(self, theme_name):
         self.current_theme = theme_name
@@ -382,10 +559,13 @@ class SpeedReader:
         
         # Update label colors
         self.label.configure(text_color=theme["fg"])
+        self.highlight_color = theme["highlight"]
+        self.orp_view.set_colors(theme["bg"], theme["fg"], self.highlight_color)
         
         # Update button colors
         for button in [self.custom_color_button, self.stats_button,
-                      self.import_button, self.library_button, self.restart_button,
+                      self.import_button, self.import_folder_button, self.library_button,
+                      self.contents_button, self.restart_button,
                       self.bookmark_button]:
             button.configure(
                 fg_color=theme["button"],
@@ -484,31 +664,60 @@ class SpeedReader:
         
     def update_reading_mode(self):
         self.reading_mode = self.mode_var.get()
+        self.rsvp.mode = self.reading_mode
+        self.update_chunk_font()
+        # Snap to the start of the sentence or paragraph being read
+        if self.text and self.index < len(self.text):
+            self.index = self.rsvp.segment_start(self.index)
         
     def show_stats(self):
         stats_window = ctk.CTkToplevel(self.root)
         stats_window.title("Reading Statistics")
-        stats_window.geometry("400x300")
+        stats_window.geometry("400x400")
         
+        # Totals are kept up to date by the stats store as records arrive
+        today = self.reading_stats["days"].get(datetime.now().strftime("%Y-%m-%d"), {})
+        book = self.reading_stats["books"].get(self.current_book, {})
         stats_text = f"""
         Total Words Read: {self.reading_stats['total_words_read']}
         Total Reading Time: {self.reading_stats['total_time']:.1f} minutes
         Average Speed: {self.reading_stats['average_speed']:.1f} wpm
+        
+        Today: {today.get('words_read', 0)} words in {today.get('time', 0):.1f} minutes
+        This Book: {book.get('words_read', 0)} words in {book.get('time', 0):.1f} minutes
         """
         
         stats_label = ctk.CTkLabel(stats_window, text=stats_text, font=("Poppins", 14))
         stats_label.pack(pady=20)
         
+        export_btn = ctk.CTkButton(stats_window, text="Export Frame Timings", command=self.export_frame_timings)
+        export_btn.pack(pady=5)
+        
+    def export_frame_timings(self):
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json", initialfile="frame_timings.json", filetypes=[("JSON", "*.json")]
+        )
+        if path:
+            self.frame_timings.export(
+                path,
+                font=self.font_family,
+                font_size=self.font_size,
+                display_mode=self.display_mode,
+                reading_mode=self.reading_mode,
+                target_wpm=60 / self.speed,
+                natural_timing=self.natural_timing,
+                platform=sys.platform,
+            )
+            self.show_notification("Frame timings exported")
+        
     def add_bookmark(self):
-        if self.text and self.current_book:
-            bookmark = {
-                "book": self.current_book,
-                "position": self.index,
-                "word": self.text[self.index],
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.bookmarks.append(bookmark)
-            self.save_bookmarks()
+        if self.text and self.current_book and self.pending_seek is None:
+            self.bookmarks.add(
+                self.current_book,
+                self.text.source_offset(self.index),
+                self.text[self.index],
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
             
             # Show notification
             self.show_notification("Bookmark added!")
@@ -524,80 +733,134 @@ class SpeedReader:
         notification.pack(pady=5)
         self.root.after(2000, notification.destroy)
         
-    def save_bookmarks(self):
-        bookmarks_path = os.path.join(self.stats_dir, "bookmarks.json")
-        with open(bookmarks_path, "w") as f:
-            json.dump(self.bookmarks, f)
-            
     def load_bookmarks(self):
-        bookmarks_path = os.path.join(self.stats_dir, "bookmarks.json")
-        try:
-            # Check if file exists and is not empty
-            if os.path.exists(bookmarks_path) and os.path.getsize(bookmarks_path) > 0:
-                with open(bookmarks_path, "r") as f:
-                    self.bookmarks = json.load(f)
-            else:
-                # Initialize with empty list if file doesn't exist or is empty
-                self.bookmarks = []
-                self.save_bookmarks()
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Handle both missing file and invalid JSON
-            self.bookmarks = []
-            self.save_bookmarks()
+        # Bookmarks live next to the catalog; an old bookmarks.json is imported once
+        self.bookmarks = BookmarkStore(
+            os.path.join(self.base_dir, "data", "library.db"),
+            legacy_path=os.path.join(self.stats_dir, "bookmarks.json")
+        )
             
     def save_stats(self):
-        stats_path = os.path.join(self.stats_dir, "reading_stats.json")
-        with open(stats_path, "w") as f:
-            json.dump(self.reading_stats, f)
+        # Reading has paused: close the session's running interval and write
+        # any batched records to the journal, off the Tk thread
+        self.session.pause()
+        self.record_session()
+        self.stats_store.flush_async()
+            
+    def record_session(self):
+        record = self.session.checkpoint()
+        if record:
+            self.stats_store.record(record)
             
     def load_stats(self):
-        stats_path = os.path.join(self.stats_dir, "reading_stats.json")
-        try:
-            # Check if file exists and is not empty
-            if os.path.exists(stats_path) and os.path.getsize(stats_path) > 0:
-                with open(stats_path, "r") as f:
-                    self.reading_stats = json.load(f)
-            else:
-                # Initialize with default stats if file doesn't exist or is empty
-                self.reading_stats = {
-                    "total_words_read": 0,
-                    "total_time": 0,
-                    "average_speed": 0,
-                    "sessions": []
-                }
-                self.save_stats()
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Handle both missing file and invalid JSON
-            self.reading_stats = {
-                "total_words_read": 0,
-                "total_time": 0,
-                "average_speed": 0,
-                "sessions": []
-            }
-            self.save_stats()
+        # Totals come from the snapshot plus the journal tail
+        self.reading_stats = self.stats_store.load()
             
     def update_speed(self, val):
         self.speed = float(val)
+        self.rsvp.speed = self.speed
         
     def update_font_size(self, val):
         self.font_size = int(val)
+        self.update_chunk_font()
         if self.text and self.index < len(self.text):
             self.label.configure(font=("Poppins", self.font_size, "bold"))
             
     def update_font(self, font_name):
         self.font_family = font_name
+        self.update_chunk_font()
         if self.text and self.index < len(self.text):
             self.label.configure(font=(self.font_family, self.font_size, "bold"))
             
+    def update_chunk_font(self):
+        # Chunks are laid out once per book, font and size, not per frame
+        if self.reading_mode == "chunk":
+            key = (self.font_family, self.font_size)
+            if key != self.rsvp.chunk_key:
+                self.rsvp.set_chunk_font(key, self.render_cache.widths(*key))
+            
     def import_book(self):
-        filepath = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt")])
+        filepath = filedialog.askopenfilename(filetypes=ingest.FILE_TYPES)
         if filepath:
-            filename = os.path.basename(filepath)
-            dest_path = os.path.join(self.books_dir, filename)
-            shutil.copy(filepath, dest_path)
-            self.show_notification(f"{filename} imported!")
-            self.load_file(dest_path)
+            # Books are converted to plain text in a worker process, so large
+            # EPUBs and PDFs never freeze the window
+            if self.import_executor is None:
+                self.import_executor = ProcessPoolExecutor()
+            future = self.import_executor.submit(ingest.import_book, filepath, self.books_dir)
+            self.show_notification(f"Importing {os.path.basename(filepath)}...")
+            self.root.after(100, self.finish_import, future)
+            
+    def finish_import(self, future):
+        if not future.done():
+            self.root.after(100, self.finish_import, future)
+            return
+        try:
+            dest_path = future.result()
+        except (ingest.IngestError, OSError) as e:
+            self.show_notification(f"Import failed: {e}")
+            return
+        self.show_notification(f"{os.path.basename(dest_path)} imported!")
+        self.load_file(dest_path)
+        self.catalog.refresh_async()
+            
+    def import_folder(self):
+        folder = filedialog.askdirectory(title="Import all books in a folder")
+        if not folder:
+            return
+        if self.batch_import and self.batch_import.thread.is_alive():
+            self.show_notification("An import is already running")
+            return
+        paths = find_books(folder)
+        if not paths:
+            self.show_notification("No books found in that folder")
+            return
+        # Copying, hashing and tokenizing run in worker processes; progress
+        # comes back through the batch's event queue
+        self.batch_import = BatchImport(
+            paths, self.books_dir, self.cache_dir, known=self.catalog.hashes()
+        ).start()
+        
+        window = ctk.CTkToplevel(self.root)
+        window.title("Importing Books")
+        window.geometry("420x160")
+        status = ctk.CTkLabel(window, text=f"Importing {len(paths)} books...")
+        status.pack(pady=(20, 10))
+        bar = ctk.CTkProgressBar(window, width=360)
+        bar.set(0)
+        bar.pack(pady=5)
+        cancel_btn = ctk.CTkButton(window, text="Cancel", command=self.batch_import.cancel)
+        cancel_btn.pack(pady=10)
+        
+        def poll(batch=self.batch_import):
+            finished = False
+            latest = None
+            try:
+                while True:
+                    event = batch.events.get_nowait()
+                    if event is None:
+                        finished = True
+                        break
+                    latest = event
+            except queue.Empty:
+                pass
+            if latest and window.winfo_exists():
+                bar.set(latest.done / latest.total)
+                status.configure(text=f"{latest.done} of {latest.total}: {os.path.basename(latest.path)}")
+            if not finished:
+                self.root.after(100, poll)
+                return
+            summary = f"Imported {len(batch.imported)} books"
+            if batch.duplicates:
+                summary += f", {batch.duplicates} already in library"
+            if batch.failed:
+                summary += f", {len(batch.failed)} failed"
+            self.show_notification(summary)
+            if window.winfo_exists():
+                window.destroy()
+            self.catalog.refresh_async()
             
+        self.root.after(100, poll)
+        
     def open_library(self):
         library_window = ctk.CTkToplevel(self.root)
         library_window.title("Library")
@@ -609,6 +872,29 @@ class SpeedReader:
         
         # Books tab
         books_tab = tabview.add("Books")
+        
+        # Search and sort bar
+        search_frame = ctk.CTkFrame(books_tab)
+        search_frame.pack(fill="x", padx=20, pady=(10, 0))
+        
+        search_var = ctk.StringVar()
+        search_entry = ctk.CTkEntry(
+            search_frame,
+            textvariable=search_var,
+            placeholder_text="Search title or author"
+        )
+        search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        
+        sort_var = ctk.StringVar(value="Title")
+        sort_menu = ctk.CTkOptionMenu(
+            search_frame,
+            values=list(SORT_ORDERS),
+            variable=sort_var,
+            command=lambda _: show_books(),
+            width=100
+        )
+        sort_menu.pack(side="left", padx=5)
+        
         listbox = Listbox(
             books_tab,
             font=("Poppins", 14),
@@ -620,9 +906,37 @@ class SpeedReader:
         )
         listbox.pack(fill="both", expand=True, padx=20, pady=20)
         
-        books = os.listdir(self.books_dir)
-        for book in books:
-            listbox.insert("end", book)
+        books = []
+        
+        def show_books():
+            # Rows come from the catalog; Listbox only draws the visible lines
+            books[:] = self.catalog.books(search_var.get().strip(), sort_var.get())
+            listbox.delete(0, "end")
+            minutes_per_word = self.speed / 60
+            rows = []
+            for book in books:
+                total = book["size"] if book["byte_positions"] else book["word_count"]
+                progress = book["last_position"] / total * 100 if total else 0
+                author = f" - {book['author']}" if book["author"] else ""
+                rows.append(
+                    f"{book['title']}{author}  |  {book['word_count']:,} words  |  "
+                    f"{book['word_count'] * minutes_per_word:.0f} min  |  {progress:.0f}%"
+                )
+            if rows:
+                listbox.insert("end", *rows)
+                
+        def refresh_when_scanned():
+            # Pick up books indexed by the background catalog refresh
+            if not library_window.winfo_exists():
+                return
+            if self.catalog.refreshing:
+                library_window.after(250, refresh_when_scanned)
+            else:
+                show_books()
+                
+        search_entry.bind("<KeyRelease>", lambda e: show_books())
+        show_books()
+        refresh_when_scanned()
             
         # Bookmarks tab
         bookmarks_tab = tabview.add("Bookmarks")
@@ -637,13 +951,116 @@ class SpeedReader:
         )
         bookmarks_listbox.pack(fill="both", expand=True, padx=20, pady=20)
         
-        for bookmark in self.bookmarks:
-            bookmarks_listbox.insert("end", f"{bookmark['book']} - {bookmark['word']}")
+        bookmarks = self.bookmarks.all()
+        if bookmarks:
+            bookmarks_listbox.insert(
+                "end", *(f"{bookmark['book']} - {bookmark['word']}" for bookmark in bookmarks)
+            )
+            
+        def open_selected_bookmark(event=None):
+            selected_index = bookmarks_listbox.curselection()
+            if selected_index:
+                bookmark = bookmarks[selected_index[0]]
+                filepath = os.path.join(self.books_dir, bookmark["book"])
+                if not os.path.exists(filepath):
+                    self.show_notification(f"{bookmark['book']} is no longer in the library")
+                    return
+                self.load_file(filepath)
+                if bookmark["byte_position"]:
+                    self.go_to_offset(bookmark["position"])
+                else:
+                    # Still a word index: the book is converting it
+                    self.converted_bookmark = bookmark
+                library_window.destroy()
+                
+        bookmarks_listbox.bind("<Double-Button-1>", open_selected_bookmark)
+            
+        # Full-text search tab
+        search_tab = tabview.add("Search")
+        
+        phrase_var = ctk.StringVar()
+        phrase_entry = ctk.CTkEntry(
+            search_tab,
+            textvariable=phrase_var,
+            placeholder_text="Find a phrase in any book"
+        )
+        phrase_entry.pack(fill="x", padx=20, pady=(10, 0))
+        
+        hits_listbox = Listbox(
+            search_tab,
+            font=("Poppins", 12),
+            bg="#2A2A5A",
+            fg="#EAEAEA",
+            selectbackground="#3A3A5A",
+            selectforeground="white",
+            bd=0
+        )
+        hits_listbox.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        hits = []
+        hit_offsets = []  # Byte offset of each hit in its book, or None
+        
+        def show_hits(event=None):
+            hits[:] = self.search_index.search(phrase_var.get())
+            hits_listbox.delete(0, "end")
+            rows = []
+            opened = {}
+            hit_offsets[:] = []
+            for filename, position in hits:
+                if filename not in opened:
+                    filters = self.catalog.get_filters(filename)
+                    tokens = self.book_cache.open(os.path.join(self.books_dir, filename), filters, wait=False)
+                    # Hit positions refer to the filtered text; without it
+                    # there is no context to show yet
+                    opened[filename] = tokens if tokens.filter_key == filter_key(filters) else None
+                    if opened[filename] is None:
+                        tokens.close()
+                tokens = opened[filename]
+                if tokens is None:
+                    hit_offsets.append(None)
+                    rows.append(f"{filename}: (preparing text)")
+                    continue
+                if tokens.source_offsets is None and position >= len(tokens) and not tokens.complete:
+                    # Unfiltered text not indexed as far as the hit yet
+                    hit_offsets.append(None)
+                    rows.append(f"{filename}: (preparing text)")
+                    continue
+                hit_offsets.append(tokens.source_offset(position))
+                # Read from the book itself where the text is not indexed yet
+                words = tokens.words(max(0, position - 6), position + 10, os.path.join(self.books_dir, filename))
+                context = " ".join(words)
+                rows.append(f"{filename}: ...{context}...")
+            for tokens in opened.values():
+                if tokens is not None:
+                    tokens.close()
+            if rows:
+                hits_listbox.insert("end", *rows)
+            else:
+                hits_listbox.insert("end", "No matches")
+                
+        def open_selected_hit(event=None):
+            selected_index = hits_listbox.curselection()
+            if selected_index and selected_index[0] < len(hits):
+                filename = hits[selected_index[0]][0]
+                offset = hit_offsets[selected_index[0]]
+                self.load_file(os.path.join(self.books_dir, filename))
+                if offset is not None:
+                    self.go_to_offset(offset)
+                library_window.destroy()
+                
+        phrase_entry.bind("<Return>", show_hits)
+        hits_listbox.bind("<Double-Button-1>", open_selected_hit)
             
         def load_selected_book():
+            if tabview.get() == "Search":
+                open_selected_hit()
+                return
+            if tabview.get() == "Bookmarks":
+                open_selected_bookmark()
+                return
             selected_index = listbox.curselection()
             if selected_index:
-                selected_book = books[selected_index[0]]
+                selected_book = books[selected_index[0]]["filename"]
                 self.load_file(os.path.join(self.books_dir, selected_book))
                 library_window.destroy()
                 
@@ -658,60 +1075,314 @@ class SpeedReader:
         
     def load_file(self, filepath):
         if filepath:
-            with open(filepath, "r", encoding="utf-8") as f:
-                self.text = f.read().split()
-            self.index = 0
+            self.stop()
+            self.catalog.mark_opened(os.path.basename(filepath))
+            # Words are indexed lazily from a memory-mapped file; the first
+            # chunk is ready on return and the rest is indexed in the background.
+            # Books opened before come straight from the token cache.
+            if self.speech:
+                self.speech.cancel_prewarm()
+            if isinstance(self.text, TokenSource):
+                self.text.close()
             self.current_book = os.path.basename(filepath)
+            self.pending_seek = None
+            self.converted_bookmark = None
+            filters = self.catalog.get_filters(self.current_book)
+            self.text = self.book_cache.open(filepath, filters, wait=False)
+            self.rsvp.load(self.text)
+            if self.text.filter_key != filter_key(filters):
+                # The filtered text is being prepared in the background; the
+                # book reads unfiltered until it is ready
+                self.root.after(FILTER_POLL_MS, self.swap_when_filtered, self.text, filepath, filters)
+            self.index = 0
+            self.session = ReadingSession(self.current_book)
             self.progress.set(0)
-            self.label.configure(text="Press SPACE to begin")
+            self.show_message("Press SPACE to begin")
             
+            # Resume where this book was last left; a position the indexer
+            # has not reached yet is jumped to once it has
+            if (self.catalog.has_word_positions(self.current_book)
+                    or self.bookmarks.has_word_positions(self.current_book)):
+                self.convert_word_positions(filepath)
+            else:
+                position = self.catalog.get_position(self.current_book)
+                if position and self.text:
+                    self.go_to_offset(position)
+                
+    def swap_when_filtered(self, tokens, filepath, filters):
+        # Replaces the unfiltered text with the filtered one once it has been
+        # built, keeping the reader on the same word
+        if tokens is not self.text:
+            return  # Another book has been opened since
+        # A pending jump without a byte offset to carry over lands first
+        pending = self.pending_seek
+        if self.book_cache.filtering(filepath, filters) or pending and pending[0] is tokens and pending[2] is None:
+            self.root.after(FILTER_POLL_MS, self.swap_when_filtered, tokens, filepath, filters)
+            return
+        filtered = self.book_cache.open(filepath, filters, wait=False)
+        if filtered.filter_key == tokens.filter_key:
+            filtered.close()  # Filtering failed, so the book stays unfiltered
+            return
+        offset = self.current_offset()
+        if self.speech:
+            self.speech.cancel_prewarm()
+        self.text = filtered
+        self.rsvp.load(filtered)
+        self.go_to_offset(offset)  # Also moves running speech over to the new text
+        tokens.close()
+        
+    def convert_word_positions(self, filepath):
+        # Books read before positions were saved as byte offsets hold word
+        # indices into the unfiltered text. They are converted once, through
+        # the unfiltered book's own offsets, on a background thread as the
+        # book may have to be indexed first; the reader then jumps to the
+        # converted position, or to the bookmark being opened.
+        book = self.current_book
+        
+        def convert():
+            raw = self.book_cache.open(filepath, ())
+            try:
+                raw.wait()
+                # A book that could not be indexed to the end is converted
+                # the next time it is opened
+                if not raw.failed:
+                    self.bookmarks.convert_positions(book, raw.source_offset)
+                    self.catalog.convert_position(book, raw.source_offset)
+            finally:
+                raw.close()
+                
+        conversion = self.position_conversions.get(book)
+        if conversion is None or not conversion.is_alive():
+            conversion = self.position_conversions[book] = threading.Thread(target=convert, daemon=True)
+            conversion.start()
+        self.seek_later()
+        
+    def current_offset(self):
+        # Byte offset of the word being read, or of the one a pending jump is
+        # headed for; None while an old position is still being converted
+        if self.pending_seek is not None and self.pending_seek[0] is self.text:
+            text, index, offset = self.pending_seek
+            if offset is not None or index is None:
+                return offset
+        return self.text.source_offset(self.index)
+        
     def restart(self):
         if self.text:
+            # Paused like any other stop, so the idle time before the next
+            # start is not counted as reading
+            self.stop()
             self.index = 0
-            self.running = False
             self.progress.set(0)
-            self.label.configure(text="Press SPACE to begin")
+            self.show_message("Press SPACE to begin")
             
     def stop(self):
         self.running = False
+        self.scheduler.stop()
+        self.stop_speech()
+        self.save_stats()
+        self.save_position()
         
     def change_word(self, direction):
         if self.text:
-            self.index = max(0, min(len(self.text) - 1, self.index + direction))
-            self.label.configure(text=self.text[self.index])
+            self.go_to(self.index + direction)
+            
+    def jump(self, unit, step):
+        # Sentence, paragraph and chapter starts are looked up by bisection
+        if self.text:
+            self.go_to(self.rsvp.jump(self.index, unit, step))
+            
+    def open_contents(self):
+        if not isinstance(self.text, TokenSource):
+            self.show_notification("Open a book first")
+            return
+        tokens = self.text
+        contents_window = ctk.CTkToplevel(self.root)
+        contents_window.title("Contents")
+        contents_window.geometry("420x400")
+        
+        listbox = Listbox(
+            contents_window,
+            bg="#2A2A4A",
+            fg="white",
+            font=("Poppins", 12),
+            selectbackground="#3A3A5A",
+            selectforeground="white",
+            bd=0
+        )
+        listbox.pack(fill="both", expand=True, padx=20, pady=20)
+        
+        # Chapters found so far; a book still being indexed shows the rest later
+        chapters = list(tokens.chapter_starts)
+        for n, start in enumerate(chapters):
+            percent = start / len(tokens) * 100 if len(tokens) else 0
+            listbox.insert("end", f"{tokens.chapter_title(n) or 'Start'}  ({percent:.0f}%)")
+        current = tokens.chapter_number(self.index)
+        listbox.selection_set(current)
+        listbox.see(current)
+        
+        def open_selected_chapter(event=None):
+            selection = listbox.curselection()
+            if selection:
+                self.stop()
+                self.go_to(chapters[selection[0]])
+                contents_window.destroy()
+                
+        listbox.bind("<Double-Button-1>", open_selected_chapter)
+        listbox.bind("<Return>", open_selected_chapter)
+        go_btn = ctk.CTkButton(contents_window, text="Go", command=open_selected_chapter, width=120)
+        go_btn.pack(pady=(0, 10))
+        filters_btn = ctk.CTkButton(
+            contents_window,
+            text="Text Filters",
+            command=lambda: (contents_window.destroy(), self.open_filters()),
+            width=120
+        )
+        filters_btn.pack(pady=(0, 15))
+        
+    def open_filters(self):
+        # Per-book choice of the text filters applied before reading
+        if not isinstance(self.text, TokenSource) or not self.current_book:
+            self.show_notification("Open a book first")
+            return
+        book = self.current_book
+        enabled = self.catalog.get_filters(book)
+        filters_window = ctk.CTkToplevel(self.root)
+        filters_window.title("Text Filters")
+        filters_window.geometry("420x300")
+        
+        filter_vars = {}
+        for name, label in FILTER_LABELS.items():
+            filter_vars[name] = ctk.BooleanVar(value=name in enabled)
+            ctk.CTkCheckBox(filters_window, text=label, variable=filter_vars[name]).pack(
+                anchor="w", padx=20, pady=5
+            )
+            
+        def apply_filters():
+            filters = [name for name, var in filter_vars.items() if var.get()]
+            filters_window.destroy()
+            if tuple(filters) == enabled:
+                return
+            # The position is saved as a byte offset in the book file, so
+            # reloading with the new filters returns to the same word
+            self.save_position()
+            self.catalog.set_filters(book, filters)
+            self.load_file(os.path.join(self.books_dir, book))
+            # Search positions for the book are rebuilt with the new filters
+            self.catalog.refresh_async()
+            
+        apply_btn = ctk.CTkButton(filters_window, text="Apply", command=apply_filters, width=120)
+        apply_btn.pack(pady=15)
+        
+    def go_to(self, index):
+        if self.text:
+            if index >= len(self.text) and not self.text_complete():
+                # Target lies beyond what has been indexed so far
+                self.seek_later(index=index)
+                return
+            self.pending_seek = None
+            self.index = max(0, min(len(self.text) - 1, index))
+            self.apply_display_mode(self.text[self.index])
             self.progress.set(self.index / len(self.text))
+            # Speech follows the jump only while reading; a paused reader stays silent
+            if self.running and self.speech and self.speech.active:
+                self.speech.start(self.text, self.index)
+                
+    def go_to_offset(self, offset):
+        # Jumps to the word at a byte offset in the book file, such as a
+        # saved position or a bookmark
+        if self.text:
+            index = self.text.source_index(offset)
+            if index is None:
+                self.seek_later(offset=offset)
+            else:
+                self.go_to(index)
+                
+    def seek_later(self, index=None, offset=None):
+        # Shows a loading message until indexing reaches the target, checked
+        # from the event loop so the UI never waits on the indexer. Without
+        # an index or offset, the target is the position being converted.
+        if offset is None and index is not None and self.text.source_offsets is not None:
+            offset = self.text.source_offset(index)
+        self.pending_seek = (self.text, index, offset)
+        self.show_message("Loading...")
+        if self.seek_poll is None:
+            self.seek_poll = self.root.after(SEEK_POLL_MS, self.seek_when_indexed)
+            
+    def seek_when_indexed(self):
+        self.seek_poll = None
+        if self.pending_seek is None:
+            return
+        text, index, offset = self.pending_seek
+        if text is not self.text:
+            self.pending_seek = None  # Another book has been opened since
+            return
+        if index is None and offset is None:
+            if self.position_conversions[self.current_book].is_alive():
+                self.seek_poll = self.root.after(SEEK_POLL_MS, self.seek_when_indexed)
+                return
+            offset = 0
+            bookmark = self.converted_bookmark
+            self.converted_bookmark = None
+            if bookmark is not None:
+                if bookmark["byte_position"]:
+                    offset = bookmark["position"]
+            elif not self.catalog.has_word_positions(self.current_book):
+                offset = self.catalog.get_position(self.current_book)
+            if not offset:
+                self.pending_seek = None
+                self.show_message("Press SPACE to begin")
+                return
+        if offset is not None:
+            index = text.source_index(offset)
+        if index is not None and (index < len(text) or text.complete):
+            self.go_to(index)
+        else:
+            self.pending_seek = (text, index if offset is None else None, offset)
+            self.seek_poll = self.root.after(SEEK_POLL_MS, self.seek_when_indexed)
             
     def toggle(self, event=None):
         if self.running:
-            self.running = False
-            if self.speech_enabled:
-                self.stop_speech()
+            self.stop()
         else:
             self.running = True
             if self.speech_enabled:
                 self.start_speech()
-            threading.Thread(target=self.run, daemon=True).start()
+            self.run()
             
     def update_display_mode(self, mode):
+        previous = self.display_mode
         self.display_mode = mode.lower()
+        if self.display_mode == "orp" and previous != "orp":
+            self.orp_view.canvas.pack(pady=20, fill="x", before=self.label)
+            self.orp_view.message(self.label.cget("text"))
+            self.label.pack_forget()
+        elif previous == "orp" and self.display_mode != "orp":
+            self.label.pack(pady=20, before=self.orp_view.canvas)
+            self.orp_view.canvas.pack_forget()
         if self.text and self.index < len(self.text):
             self.apply_display_mode(self.text[self.index])
             
+    def show_message(self, text):
+        if self.display_mode == "orp":
+            self.orp_view.message(text)
+        self.label.configure(text=text)
+        
     def apply_display_mode(self, text):
-        if self.display_mode == "focus":
-            # Highlight the middle character
-            mid = len(text) // 2
-            display_text = f"{text[:mid]}|{text[mid]}|{text[mid+1:]}"
-        elif self.display_mode == "dynamic":
-            # Adjust size based on word length
-            size = max(20, min(60, 60 - len(text)))
-            self.label.configure(font=(self.font_family, size, "bold"))
-            display_text = text
-        else:  # standard
-            self.label.configure(font=(self.font_family, self.font_size, "bold"))
-            display_text = text
-            
-        self.label.configure(text=display_text)
+        # The label is only reconfigured when its text or font changes
+        self.render_cache.show(text, self.display_mode, self.font_family, self.font_size)
+        
+    def prefetch_words(self):
+        # Keep the next LOOKAHEAD words rendered ahead of the reader, which
+        # is usually one new word per frame
+        key = (self.display_mode, self.font_family, self.font_size)
+        start = self.prefetched_to
+        if key != self.prefetch_key or not self.index <= start <= self.index + LOOKAHEAD:
+            self.prefetch_key = key
+            start = self.index
+        end = min(self.index + LOOKAHEAD, len(self.text))
+        if start < end:
+            self.render_cache.prefetch(self.text[start:end], *key)
+            self.prefetched_to = end
             
     def toggle_progress(self):
         self.show_progress = self.progress_var.get()
@@ -724,6 +1395,10 @@ class SpeedReader:
         else:
             self.remove_stats_overlay()
             
+    def toggle_natural_timing(self):
+        self.natural_timing = self.natural_timing_var.get()
+        self.rsvp.natural_timing = self.natural_timing
+        
     def create_stats_overlay(self):
         if not hasattr(self, 'stats_overlay'):
             self.stats_overlay = ctk.CTkLabel(
@@ -742,153 +1417,192 @@ class SpeedReader:
             
     def update_stats_overlay(self):
         if hasattr(self, 'stats_overlay') and self.show_stats_overlay:
-            current_speed = (
-                self.index / ((time.time() - self.start_time) / 60)
-                if hasattr(self, 'start_time') and self.running
-                else 0
+            # Measured from the frames actually presented since reading resumed
+            timing = self.frame_timings.summary()
+            progress = self.index / len(self.text) * 100 if self.text else 0
+            stats_text = f"WPM: {timing['effective_wpm']:.0f} / {60 / self.speed:.0f} target\n"
+            stats_text += (
+                f"Jitter p50/p95/p99: {timing['jitter_p50_ms']:.1f} / "
+                f"{timing['jitter_p95_ms']:.1f} / {timing['jitter_p99_ms']:.1f} ms\n"
             )
-            stats_text = f"WPM: {current_speed:.0f}\n"
-            stats_text += f"Progress: {(self.index / len(self.text) * 100):.1f}%"
+            stats_text += f"Dropped Frames: {timing['dropped']} of {timing['frames']}\n"
+            stats_text += f"Progress: {progress:.1f}%"
             self.stats_overlay.configure(text=stats_text)
             self.root.after(1000, self.update_stats_overlay)
 
     def run(self):
-        self.start_time = time.time()
-        while self.running and self.index < len(self.text):
-            if self.reading_mode == "word":
-                current_text = self.text[self.index]
-            elif self.reading_mode == "sentence":
-                # Collect words until we find end of sentence
-                sentence = []
-                while self.index < len(self.text):
-                    word = self.text[self.index]
-                    sentence.append(word)
-                    self.index += 1
-                    if word.endswith(('.', '!', '?')):
-                        break
-                current_text = ' '.join(sentence)
-                self.index -= 1  # Adjust for the extra increment
-            else:  # paragraph
-                # Collect words until we find double newline or reach limit
-                paragraph = []
-                word_count = 0
-                while self.index < len(self.text) and word_count < 50:
-                    word = self.text[self.index]
-                    paragraph.append(word)
-                    self.index += 1
-                    word_count += 1
-                    if word.endswith('\n\n'):
-                        break
-                current_text = ' '.join(paragraph)
-                self.index -= 1  # Adjust for the extra increment
+        # Frames are presented on the Tk event loop by the scheduler
+        self.session.resume()
+        self.frame_timings.reset()
+        self.scheduler.start(self.next_frame)
+        
+    def text_complete(self):
+        return getattr(self.text, "complete", True)
+        
+    def next_frame(self):
+        if self.running and (self.pending_seek is not None or
+                             self.index >= len(self.text) and not self.text_complete()):
+            # Hold the current frame until the background indexer catches up
+            return Wait(self.speed)
+        speech = self.speech if self.speech and self.speech.active else None
+        if self.running and speech:
+            # With speech on, the display follows the audio: a word is shown
+            # once the playing chunk reaches it
+            wait = speech.time_until(self.index)
+            if wait is None or wait > self.scheduler.late_tolerance:
+                return Wait(SPEECH_POLL if wait is None else min(wait, SPEECH_POLL))
+        if self.running and self.index < len(self.text):
+            # Frame contents come from the headless engine
+            frame = self.rsvp.frame_at(self.index)
             
             # Apply the current display mode
-            self.apply_display_mode(current_text)
+            self.apply_display_mode(frame.text)
             
             if self.show_progress:
-                self.progress.set(self.index / len(self.text))
+                self.progress.set((frame.end - 1) / len(self.text))
                 
-            self.index += 1
-            
-            # Wait for the specified speed
-            time.sleep(self.speed)
-            
-            # Update reading statistics
-            end_time = time.time()
-            reading_time = (end_time - self.start_time) / 60  # Convert to minutes
-            words_read = self.index
-            wpm = (words_read / reading_time) if reading_time > 0 else 0
-            
-            self.reading_stats["total_words_read"] += words_read
-            self.reading_stats["total_time"] += reading_time
-            self.reading_stats["average_speed"] = (
-                self.reading_stats["total_words_read"] / self.reading_stats["total_time"]
-                if self.reading_stats["total_time"] > 0 else 0
-            )
-            
-            self.reading_stats["sessions"].append({
-                "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "words_read": words_read,
-                "time": reading_time,
-                "speed": wpm
-            })
+            self.index = frame.end
+            if self.reading_mode == "word":
+                self.prefetch_words()
             
-            # Save updated statistics
-            self.save_stats()
+            # Each word is counted once, whatever the frame size; totals are
+            # journaled every few seconds rather than on every frame
+            self.session.count(frame.end - frame.start)
+            self.frame_timings.count_words(frame.end - frame.start)
+            if self.session.checkpoint_due(STATS_CHECKPOINT):
+                self.record_session()
             
-            if self.index >= len(self.text):
+            if self.index >= len(self.text) and self.text_complete():
                 self.running = False
+                self.save_stats()
                 self.show_notification("Reading completed!")
+                return None
+            
+            # Duration of this frame; the next deadline is scheduled from it
+            if speech:
+                until = speech.time_until(frame.end)
+                if until is not None:
+                    return max(0.0, until)
+            return frame.duration
+        return None
 
     def toggle_speech(self):
         self.speech_enabled = self.speech_var.get()
-        if self.speech_enabled and self.text and self.index < len(self.text):
+        if self.speech_enabled and self.running and self.text and self.index < len(self.text):
             self.start_speech()
         else:
             self.stop_speech()
             
     def update_speech_rate(self, rate):
-        self.engine.setProperty('rate', int(rate))
+        self.speech_rate = int(rate)
+        self.set_engine_property('rate', self.speech_rate)
+        self.update_speech_cache_key()
         
     def update_voice(self, voice_name):
         # Find the index of the selected voice
         for i, voice in enumerate(self.voices):
             if voice.name == voice_name:
                 self.current_voice = i
-                self.engine.setProperty('voice', voice.id)
+                self.voice_id = voice.id
+                self.set_engine_property('voice', voice.id)
                 break
-                
+        self.update_speech_cache_key()
+        
+    def set_engine_property(self, name, value):
+        # Once speech is set up, its synthesis thread owns the engine and
+        # changes are queued through the backend
+        if self.speech_backend:
+            self.speech_backend.backend.set_property(name, value)
+        elif self.engine:
+            self.engine.setProperty(name, value)
+            
+    def update_speech_cache_key(self):
+        # Cached audio is only reused for the same voice and rate. The
+        # engine reports a new voice only once it has spoken with it, so the
+        # voice picked is used rather than asking the engine.
+        if self.speech_backend:
+            self.speech_backend.voice = self.voice_id
+            self.speech_backend.rate = self.speech_rate
+            
+    def ensure_speech(self):
+        if not self.ensure_engine():
+            return False
+        if self.speech is None:
+            self.speech_backend = CachedBackend(
+                Pyttsx3Backend(self.engine), AudioCache(os.path.join(self.cache_dir, "audio"))
+            )
+            self.speech = SpeechPipeline(self.speech_backend)
+            self.update_speech_cache_key()
+        return True
+        
     def start_speech(self):
-        if self.speech_thread and self.speech_thread.is_alive():
-            self.stop_speech()
+        if not self.ensure_speech():
+            return
+        # Sentences are synthesized ahead while the current one plays, and
+        # the next few are warmed into the audio cache in the background
+        self.speech.start(self.text, self.index)
+        if not self.speech.prewarming and hasattr(self.text, "sentence_starts"):
+            starts = self.text.sentence_starts
+            n = bisect_right(starts, self.index)
+            start = starts[n] if n < len(starts) else len(self.text)
+            end = starts[n + PREWARM_SENTENCES] if n + PREWARM_SENTENCES < len(starts) else len(self.text)
+            self.speech.prewarm(self.text, start, end)
             
-        def speak_text():
-            while self.speech_enabled and self.running and self.index < len(self.text):
-                if self.reading_mode == "word":
-                    word = self.text[self.index]
-                    self.engine.say(word)
-                    self.engine.runAndWait()
-                    time.sleep(self.speed)
-                elif self.reading_mode == "sentence":
-                    # Collect words until we find end of sentence
-                    sentence = []
-                    temp_index = self.index
-                    while temp_index < len(self.text):
-                        word = self.text[temp_index]
-                        sentence.append(word)
-                        temp_index += 1
-                        if word.endswith(('.', '!', '?')):
-                            break
-                    sentence_text = ' '.join(sentence)
-                    self.engine.say(sentence_text)
-                    self.engine.runAndWait()
-                    time.sleep(self.speed * len(sentence))
-                else:  # paragraph
-                    # Collect words until we find double newline or reach limit
-                    paragraph = []
-                    temp_index = self.index
-                    word_count = 0
-                    while temp_index < len(self.text) and word_count < 50:
-                        word = self.text[temp_index]
-                        paragraph.append(word)
-                        temp_index += 1
-                        word_count += 1
-                        if word.endswith('\n\n'):
-                            break
-                    paragraph_text = ' '.join(paragraph)
-                    self.engine.say(paragraph_text)
-                    self.engine.runAndWait()
-                    time.sleep(self.speed * len(paragraph))
-                
-        self.speech_thread = threading.Thread(target=speak_text, daemon=True)
-        self.speech_thread.start()
+    def prewarm_chapter(self):
+        # Synthesizes the rest of the current chapter into the audio cache
+        if not isinstance(self.text, TokenSource):
+            self.show_notification("Open a book first")
+            return
+        if not self.ensure_speech():
+            self.show_notification("Text-to-speech is not available")
+            return
+        start = self.text.sentence_bounds(self.index)[0]
+        self.speech.prewarm(self.text, start, self.text.chapter_bounds(self.index)[1])
+        self.show_notification("Preparing speech for this chapter")
         
     def stop_speech(self):
-        if self.speech_thread and self.speech_thread.is_alive():
-            self.speech_thread.join(timeout=0.1)
-        self.engine.stop()
+        if self.speech:
+            self.speech.stop()
 
-if __name__ == "__main__":
+def import_from_command_line(source):
+    # Headless bulk import: speedreader --import FOLDER_OR_GLOB
+    books_dir = os.path.join(BASE_DIR, "data", "books")
+    cache_dir = os.path.join(BASE_DIR, "data", "cache")
+    os.makedirs(books_dir, exist_ok=True)
+    book_cache = BookCache(cache_dir, workers=os.cpu_count() or 1)
+    catalog = LibraryCatalog(
+        os.path.join(BASE_DIR, "data", "library.db"), books_dir, book_cache,
+        SearchIndex(os.path.join(BASE_DIR, "data", "search.db"))
+    )
+    paths = find_books(source)
+    if not paths:
+        print(f"No books found in {source}")
+        return 1
+    batch = BatchImport(paths, books_dir, cache_dir, known=catalog.hashes()).start()
+    try:
+        for event in iter(batch.events.get, None):
+            detail = f" ({event.message})" if event.message else ""
+            print(f"[{event.done}/{event.total}] {event.status}: {event.path}{detail}")
+    except KeyboardInterrupt:
+        batch.cancel()
+        batch.thread.join()
+    print(f"Imported {len(batch.imported)}, duplicates {batch.duplicates}, failed {len(batch.failed)}")
+    print("Updating library...")
+    catalog.refresh()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed Reader Pro")
+    parser.add_argument("--import", dest="import_source", metavar="FOLDER_OR_GLOB",
+                        help="Import every book in a folder or matching a pattern, then exit")
+    args = parser.parse_args()
+    if args.import_source:
+        sys.exit(import_from_command_line(args.import_source))
     root = ctk.CTk()
     app = SpeedReader(root)
-    root.mainloop() 
\ No newline at end of file
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+
+
+def default_stats():
+    return {
+        "total_words_read": 0,
+        "total_time": 0,
+        "average_speed": 0,
+        # Rolling totals per book and per day, kept up to date as records
+        # are applied
+        "books": {},
+        "days": {}
+    }
+
+
+def add_to(totals, key, words, minutes):
+    entry = totals.get(key)
+    if entry is None:
+        entry = totals[key] = {"words_read": 0, "time": 0}
+    entry["words_read"] += words
+    entry["time"] += minutes
+
+
+class StatsStore:
+    # Reading stats are kept as a small snapshot of totals plus an append-only
+    # journal of session records written since the last compaction. Compaction
+    # moves journal records into an archive file that is never read on load.
+    # record() only batches; journal writes and their fsync happen on a
+    # writer thread, or in flush() when the caller needs them on disk.
+    def __init__(self, stats_dir, flush_interval=5.0, batch_size=200, compact_every=2000):
+        self.snapshot_path = os.path.join(stats_dir, "reading_stats.json")
+        self.journal_path = os.path.join(stats_dir, "reading_stats.journal")
+        self.archive_path = os.path.join(stats_dir, "reading_sessions.jsonl")
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self.lock = threading.Lock()  # Guards the totals and pending records
+        self.write_lock = threading.Lock()  # Orders writes to the files
+        self.writer = None
+        self.stats = default_stats()
+        self.seq = 0  # Sequence number of the last record applied
+        self.snapshot_seq = 0  # Sequence number folded into the snapshot
+        self.journal_records = 0
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def load(self):
+        with self.lock:
+            self.stats = default_stats()
+            self.seq = self.snapshot_seq = 0
+            legacy_sessions = []
+            try:
+                if os.path.exists(self.snapshot_path) and os.path.getsize(self.snapshot_path) > 0:
+                    with open(self.snapshot_path, "r") as f:
+                        snapshot = json.load(f)
+                    for key in self.stats:
+                        self.stats[key] = snapshot.get(key, self.stats[key])
+                    self.seq = self.snapshot_seq = snapshot.get("journal_seq", 0)
+                    # Older versions stored every session inside the snapshot
+                    legacy_sessions = snapshot.get("sessions", [])
+            except (OSError, ValueError):
+                self.stats = default_stats()
+
+            # Replay the journal tail; a torn last line from a crash is cut off
+            # so the next append starts on a clean line
+            self.journal_records = 0
+            if os.path.exists(self.journal_path):
+                valid_end = 0
+                with open(self.journal_path, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        valid_end += len(line)
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        self.journal_records += 1
+                        if record.get("seq", 0) > self.seq:
+                            self.apply(record)
+                            self.seq = record["seq"]
+                if valid_end < os.path.getsize(self.journal_path):
+                    with open(self.journal_path, "r+b") as f:
+                        f.truncate(valid_end)
+
+        if legacy_sessions:
+            with self.write_lock:
+                self.archive(legacy_sessions)
+                with self.lock:
+                    snapshot, seq = self.snapshot(), self.seq
+                self.write_snapshot(snapshot, seq)
+        return self.stats
+
+    def apply(self, record):
+        # Records carry the words and minutes read since the previous record
+        words = record.get("words_read", 0)
+        minutes = record.get("time", 0)
+        self.stats["total_words_read"] += words
+        self.stats["total_time"] += minutes
+        if record.get("book"):
+            add_to(self.stats["books"], record["book"], words, minutes)
+        if record.get("date"):
+            add_to(self.stats["days"], record["date"][:10], words, minutes)
+        self.stats["average_speed"] = (
+            self.stats["total_words_read"] / self.stats["total_time"]
+            if self.stats["total_time"] > 0 else 0
+        )
+
+    def record(self, session):
+        with self.lock:
+            self.seq += 1
+            record = dict(session, seq=self.seq)
+            self.apply(record)
+            self.pending.append(record)
+            due = (
+                len(self.pending) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush_async()
+
+    def flush_async(self):
+        # Writes batched records on a background thread, so the caller (the
+        # Tk thread) never waits for the disk
+        with self.lock:
+            if self.writer is not None and self.writer.is_alive():
+                return
+            self.writer = threading.Thread(target=self.flush, daemon=True)
+            self.writer.start()
+
+    def flush(self):
+        # Appends batched records to the journal, compacting it once it has
+        # grown long. Records taken here are on disk when it returns.
+        with self.write_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+                self.last_flush = time.monotonic()
+                compact = self.journal_records + len(pending) >= self.compact_every
+                # Taken with the records, so the snapshot covers exactly the
+                # journal as written below
+                snapshot = self.snapshot() if compact else None
+                seq = self.seq
+            if pending:
+                with open(self.journal_path, "a") as f:
+                    f.write("".join(json.dumps(r) + "\n" for r in pending))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.journal_records += len(pending)
+            if compact:
+                self.compact(snapshot, seq)
+
+    def compact(self, snapshot, seq):
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        records = [r for r in records if r.get("seq", 0) > self.snapshot_seq]
+        self.archive(records)
+        # The snapshot carries the journal sequence it covers, so a crash
+        # before the journal is truncated cannot count records twice
+        self.write_snapshot(snapshot, seq)
+        open(self.journal_path, "w").close()
+        self.journal_records = 0
+
+    def archive(self, sessions):
+        if not sessions:
+            return
+        with open(self.archive_path, "a") as f:
+            f.write("".join(json.dumps(s) + "\n" for s in sessions))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def snapshot(self):
+        # The totals as snapshot text; the per-book and per-day dicts keep
+        # changing, so they are serialized while the lock is held
+        return json.dumps(dict(self.stats, journal_seq=self.seq))
+
+    def write_snapshot(self, snapshot, seq):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_seq = seq
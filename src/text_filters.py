@@ -0,0 +1,265 @@
+import re
+from collections import deque, namedtuple
+
+from tokens import CHAPTER_END, PARAGRAPH_END, TITLE_STRIP, TITLE_WORDS
+
+FILTERS_VERSION = 1  # Bump whenever a filter changes what it produces
+
+# One word on its way through the filters: its text, its TokenSource flags,
+# whether a line break follows it, the title of the chapter starting at
+# this word, if any, and its byte offset in the unfiltered book
+Word = namedtuple("Word", "text flags newline title offset", defaults=(False, None, 0))
+
+# First word of a "KEY: value" metadata line or an "@ name: ..." bookmark line
+METADATA_KEY_RE = re.compile(
+    r"(?:[A-Z][A-Z0-9_-]*|Title|Author|Translator|Editor|Illustrator|Language|Credits):$|@$"
+)
+METADATA_LINE_WORDS = 16  # Longer lines are prose, whatever they start with
+METADATA_PARAGRAPH_WORDS = 64
+# First line of a heading paragraph, and the words that can open one
+HEADING_LINE_RE = re.compile(
+    r"[=#*_( ]*(?:CHAPTER|Chapter|BOOK|Book|PART|Part|PROLOGUE|Prologue|EPILOGUE|Epilogue)\b"
+)
+# Project Gutenberg markers, as lower-case words with asterisks stripped
+GUTENBERG_START = ("", "start", "of")
+GUTENBERG_ENDS = (
+    ("", "end", "of"),
+    ("end", "of", "the", "project", "gutenberg"),
+    ("end", "of", "this", "project", "gutenberg"),
+    ("end", "of", "project", "gutenberg's"),
+)
+MARKER_LAST_WORDS = {marker[-1] for marker in GUTENBERG_ENDS + (GUTENBERG_START,)}
+GUTENBERG_WINDOW = 5000  # Words searched for the start marker
+OPENING_QUOTE_RE = re.compile(r"^([(\[]*)(``|`|\")")
+OPENING_QUOTES = {"``": "“", "`": "‘", '"': "“"}
+CLOSING_QUOTES = (("''", "”"), ('"', "”"), ("'", "’"), ("`", "‘"))
+
+PARAGRAPH_SEPARATOR = b"\n\n"
+CHAPTER_SEPARATOR = b"\n\n\f\n\n"
+
+
+def source_words(tokens):
+    # The words of an indexed TokenSource, each noting whether a line break
+    # follows it
+    data, offsets, lengths, flags = tokens.data, tokens.offsets, tokens.lengths, tokens.flags
+    count = len(tokens)
+    for i in range(count):
+        start = offsets[i]
+        end = start + lengths[i]
+        following = offsets[i + 1] if i + 1 < count else end
+        newline = data.find(b"\n", end, following) != -1
+        yield Word(data[start:end].decode("utf-8", errors="replace"), flags[i], newline, None, start)
+
+
+def lines(words):
+    # Splits a run of words into lines; a paragraph end also ends a line
+    line = []
+    for word in words:
+        line.append(word)
+        if word.newline or word.flags & PARAGRAPH_END:
+            yield line
+            line = []
+    if line:
+        yield line
+
+
+def strip_gutenberg(words, meta):
+    # Drops the Project Gutenberg header up to the "*** START OF" line, and
+    # everything from the end-of-book marker on, which is the licence
+    words = iter(words)
+    head = []
+    for word in words:
+        head.append(word)
+        if marker_at(head, (GUTENBERG_START,)) is not None:
+            # The rest of the marker line goes as well
+            while not (word.newline or word.flags & PARAGRAPH_END):
+                word = next(words, None)
+                if word is None:
+                    return
+            head = []
+            break
+        if len(head) >= GUTENBERG_WINDOW:
+            break
+    recent = deque()
+    for word in chain_words(head, words):
+        recent.append(word)
+        start = marker_at(recent, GUTENBERG_ENDS)
+        if start is not None:
+            for _ in range(start):
+                yield recent.popleft()
+            return
+        if len(recent) > 5:
+            yield recent.popleft()
+    yield from recent
+
+
+def chain_words(first, rest):
+    yield from first
+    yield from rest
+
+
+def marker_at(words, markers):
+    # Where one of the markers starts if the words end with it, else None
+    if not words or words[-1].text.strip("*").lower() not in MARKER_LAST_WORDS:
+        return None
+    for marker in markers:
+        n = len(marker)
+        if len(words) >= n:
+            tail = [words[i].text.strip("*").lower() for i in range(len(words) - n, len(words))]
+            if tuple(tail) == marker:
+                return len(words) - n
+    return None
+
+
+def strip_metadata(words, meta):
+    # Drops paragraphs made only of "KEY: value" lines, such as a TITLE: and
+    # AUTHOR: header or trailing bookmark lines; the values go to meta
+    pending = []
+    at_paragraph_start = True
+    for word in words:
+        if pending or at_paragraph_start and METADATA_KEY_RE.match(word.text):
+            pending.append(word)
+            if word.flags & PARAGRAPH_END:
+                entries = [metadata_entry(line) for line in lines(pending)]
+                if all(entries):
+                    for key, value in entries:
+                        if key != "@":
+                            meta.setdefault("metadata", {})[key] = value
+                else:
+                    yield from pending
+                pending = []
+            elif len(pending) > METADATA_PARAGRAPH_WORDS:
+                yield from pending
+                pending = []
+        else:
+            yield word
+        at_paragraph_start = bool(word.flags & PARAGRAPH_END)
+    yield from pending
+
+
+def metadata_entry(line):
+    if len(line) > METADATA_LINE_WORDS or not METADATA_KEY_RE.match(line[0].text):
+        return None
+    return line[0].text.rstrip(":").lower(), " ".join(word.text for word in line[1:])
+
+
+def extract_chapters(words, meta):
+    # Takes short heading paragraphs whose first line opens with "CHAPTER",
+    # "Part" and the like out of the text; their lines become the title of
+    # the chapter that starts at the next word
+    pending = []
+    title = None
+    at_paragraph_start = True
+    for word in words:
+        if pending or at_paragraph_start and (HEADING_LINE_RE.match(word.text) or
+                                              not word.text.strip(TITLE_STRIP)):
+            pending.append(word)
+            if word.flags & PARAGRAPH_END:
+                heading = [" ".join(w for w in (w.text.strip(TITLE_STRIP) for w in line) if w)
+                           for line in lines(pending)]
+                if HEADING_LINE_RE.match(" ".join(w.text for w in next(lines(pending)))):
+                    title = ": ".join(line for line in heading if line)
+                else:
+                    yield from pending
+                pending = []
+            elif len(pending) > TITLE_WORDS:
+                yield from pending
+                pending = []
+        else:
+            if title is not None:
+                word = word._replace(title=title)
+                title = None
+            yield word
+        at_paragraph_start = bool(word.flags & PARAGRAPH_END)
+    yield from pending
+
+
+def dehyphenate(words, meta):
+    # Joins a word broken by a hyphen at the end of a line, such as
+    # "WAISTCOAT-" / "POCKET", keeping the hyphen. Dashes ("--") are left.
+    held = None
+    for word in words:
+        if held is not None:
+            if word.text[:1].isalpha() and word.title is None:
+                word = word._replace(text=held.text + word.text, title=held.title, offset=held.offset)
+            else:
+                yield held
+            held = None
+        if (word.newline and not word.flags & PARAGRAPH_END and word.text.endswith("-")
+                and not word.text.endswith("--") and word.text[:1].isalpha()):
+            held = word
+        else:
+            yield word
+    if held is not None:
+        yield held
+
+
+def normalize_quotes(words, meta):
+    # `Backtick', ``double'' and straight quotes become typographic ones
+    for word in words:
+        text = word.text
+        if "`" in text or "'" in text or '"' in text:
+            text = OPENING_QUOTE_RE.sub(lambda m: m.group(1) + OPENING_QUOTES[m.group(2)], text)
+            for quote, replacement in CLOSING_QUOTES:
+                text = text.replace(quote, replacement)
+            word = word._replace(text=text)
+        yield word
+
+
+# Applied in this order; each takes and returns a stream of Words
+FILTERS = {
+    "gutenberg": strip_gutenberg,
+    "metadata": strip_metadata,
+    "chapters": extract_chapters,
+    "dehyphenate": dehyphenate,
+    "quotes": normalize_quotes,
+}
+FILTER_LABELS = {
+    "gutenberg": "Strip Project Gutenberg header and licence",
+    "metadata": "Strip metadata lines (TITLE:, AUTHOR:, ...)",
+    "chapters": "Move chapter headings to the contents",
+    "dehyphenate": "Join words hyphenated across lines",
+    "quotes": "Typographic quotes",
+}
+DEFAULT_FILTERS = tuple(FILTERS)
+
+
+def filter_key(names):
+    # Short name for a set of filters, used in cache file names
+    names = [name for name in FILTERS if name in names]
+    return f"f{FILTERS_VERSION}-" + "-".join(name[:4] for name in names) if names else "raw"
+
+
+def filter_words(words, names, meta):
+    for name, stage in FILTERS.items():
+        if name in names:
+            words = stage(words, meta)
+    return words
+
+
+def filter_book(tokens, names, f, offsets=None):
+    # Streams the words of an indexed book through the named filters in one
+    # pass, writing the result to f as text TokenSource can index. Every
+    # word written is one token, so the chapter titles collected in the
+    # returned metadata are keyed by their word index in that text, and the
+    # source offset of each word is appended to offsets in the same order.
+    meta = {"chapters": []}
+    position = 0
+    separator = b""
+    for word in filter_words(source_words(tokens), names, meta):
+        if word.title is not None:
+            meta["chapters"].append((position, word.title))
+            if position:
+                separator = CHAPTER_SEPARATOR
+        f.write(separator)
+        f.write(word.text.encode("utf-8"))
+        if offsets is not None:
+            offsets.append(word.offset)
+        position += 1
+        if word.flags & CHAPTER_END:
+            separator = CHAPTER_SEPARATOR
+        elif word.flags & PARAGRAPH_END:
+            separator = PARAGRAPH_SEPARATOR
+        else:
+            separator = b"\n" if word.newline else b" "
+    return meta
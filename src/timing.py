@@ -0,0 +1,64 @@
+from array import array
+from itertools import accumulate, repeat
+
+from tokens import CHAPTER_END, PARAGRAPH_END, PUNCTUATION, SENTENCE_END
+
+MAX_LENGTH = 20  # Longer words get no extra time
+# Relative time for a word of n bytes, before normalization
+LENGTH_WEIGHTS = [0.85 + 0.03 * n for n in range(MAX_LENGTH + 1)]
+# Extra time after a word, by its flags; the strongest break wins
+PAUSE_WEIGHTS = [
+    2.0 if flags & CHAPTER_END else
+    1.5 if flags & PARAGRAPH_END else
+    1.0 if flags & SENTENCE_END else
+    0.5 if flags & PUNCTUATION else 0.0
+    for flags in range(16)
+]
+RARE_WORD_FACTOR = 1.15  # Extra time for words missing from the word list
+STRIP_BYTES = b"\"'()[]{}<>.,;:!?-`*_\xe2\x80\x98\x99\x9c\x9d"  # Also curly quotes
+
+
+def load_wordlist(path):
+    # Lower-case words as bytes, so tokens can be checked without decoding
+    try:
+        with open(path, "rb") as f:
+            return frozenset(f.read().lower().split())
+    except OSError:
+        return frozenset()
+
+
+def copy_values(values, count):
+    # The first count values of an index array as a new array. A cached
+    # book's arrays are views into a mapping that close() releases, and a
+    # slice of one would keep the mapping from closing while it is in use.
+    copy = array(values.format if isinstance(values, memoryview) else values.typecode)
+    copy.frombytes(values.tobytes())
+    del copy[count:]
+    return copy
+
+
+def cumulative_weights(tokens, common_words=None):
+    # Prefix sums of per-word display weights, scaled so the average word
+    # weighs 1. A frame covering words [start, end) is shown for
+    # speed * (cum[end] - cum[start]), which keeps the configured speed on
+    # average while short words go by faster and breaks get a pause.
+    count = len(tokens)
+    lengths = copy_values(tokens.lengths, count)
+    flags = copy_values(tokens.flags, count)
+    weights = array("d", map(
+        float.__add__,
+        map(LENGTH_WEIGHTS.__getitem__, map(min, lengths, repeat(MAX_LENGTH))),
+        map(PAUSE_WEIGHTS.__getitem__, flags)
+    ))
+    if common_words:
+        data, offsets = tokens.data, tokens.offsets
+        for i in range(count):
+            start = offsets[i]
+            word = data[start:start + lengths[i]].strip(STRIP_BYTES).lower()
+            if word and word not in common_words:
+                weights[i] *= RARE_WORD_FACTOR
+    total = sum(weights)
+    scale = count / total if total else 1.0
+    cum = array("d", [0.0])
+    cum.extend(accumulate(map(scale.__mul__, weights)))
+    return cum
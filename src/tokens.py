@@ -0,0 +1,443 @@
+import mmap
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from functools import partial
+from itertools import chain, starmap
+
+from segmenters import detect_segmenter, get_segmenter
+
+TOKENIZER_VERSION = 5  # Bump whenever tokenization or flag rules change
+TOKEN_RE = re.compile(rb"\S+")
+# A paragraph opening with a short "CHAPTER IV" or "Part Two" style line
+HEADING_RE = re.compile(
+    rb"[=#*_( \t]*(?:CHAPTER|Chapter|BOOK|Book|PART|Part|PROLOGUE|Prologue|EPILOGUE|Epilogue)\b[^\n]{0,40}(?:\n|$)"
+)
+TITLE_STRIP = "=#*_()[]{} "
+TITLE_WORDS = 12  # Longest chapter title shown in the table of contents
+CHUNK_SIZE = 1 << 20  # Bytes tokenized per indexing step
+PARALLEL_MIN_BYTES = 32 << 20  # Smaller files are indexed on one core
+PARALLEL_RANGE_SIZE = 16 << 20  # Bytes per range handed to a worker process
+SOURCE_WORD_BYTES = 256  # Read for the last word when words are read from the original book
+CANCEL_POLL = 0.1  # Seconds between checks for close() while waiting on a worker process
+
+# Per-token flags
+SENTENCE_END = 1
+PARAGRAPH_END = 2
+PUNCTUATION = 4
+CHAPTER_END = 8  # Set when a form feed follows the word, as written by the importers
+
+SENTENCE_MARKS = b".!?"
+PAUSE_MARKS = b",;:"
+CLOSING_MARKS = b"\"')]`"
+# Right single and double quotes, and CJK closing brackets
+CLOSING_QUOTES = frozenset("’”」』）》".encode("utf-8")[i:i + 3] for i in range(0, 18, 3))
+# Full-width sentence and pause marks
+WIDE_SENTENCE_MARKS = frozenset("。！？".encode("utf-8")[i:i + 3] for i in range(0, 9, 3))
+WIDE_PAUSE_MARKS = frozenset("，、；：".encode("utf-8")[i:i + 3] for i in range(0, 12, 3))
+
+
+def gap_flags(data, last_end, start):
+    # A blank line between two words ends the paragraph, a form feed ends
+    # the chapter, and sentences never run across either
+    flags = 0
+    newline = data.find(b"\n", last_end, start)
+    if newline != -1 and data.find(b"\n", newline + 1, start) != -1:
+        flags |= PARAGRAPH_END | SENTENCE_END
+    if data.find(b"\f", last_end, start) != -1:
+        flags |= CHAPTER_END | PARAGRAPH_END | SENTENCE_END
+    return flags
+
+
+def whitespace_after(data, pos):
+    # First whitespace byte at or after pos, so ranges never split a word
+    size = len(data)
+    while pos < size and not data[pos:pos + 1].isspace():
+        pos += 1
+    return pos
+
+
+def split_ranges(data, start, range_size):
+    ranges = []
+    size = len(data)
+    while start < size:
+        end = whitespace_after(data, min(size, start + range_size))
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def new_index(large=False):
+    # offsets (64-bit for buffers of 4 GiB and up), lengths, flags, and the
+    # word indices where each sentence, paragraph and chapter begins
+    return (array("Q" if large else "I"), array("I"), array("B"),
+            array("I"), array("I"), array("I"))
+
+
+def index_range(filepath, start, end, segmenter=None):
+    # Worker process entry point: tokenizes one byte range of a file as if
+    # it were a whole text, for TokenSource.merge() to stitch together
+    with open(filepath, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index = new_index(len(data) >= 1 << 32)
+            TokenSource.scan(data, start, end, index, start, get_segmenter(segmenter))
+            return index
+        finally:
+            data.close()
+
+
+class TokenSource:
+    # Sequence-like view over the words of a book, stored as one contiguous
+    # UTF-8 buffer (a memory-mapped file or bytes) plus offset, length and
+    # flag arrays. Words are decoded only when accessed. The first chunk is
+    # indexed up front so reading can start immediately, and the rest of the
+    # buffer is indexed on a background thread. A prebuilt index (for example
+    # from the book cache) can be passed in to skip tokenization entirely.
+    # With workers > 1, the rest of a large file is split into byte ranges
+    # that are tokenized in parallel processes and merged in order, giving
+    # the same index as the single-threaded path.
+    # Words are runs of non-space bytes, split further by a named segmenter
+    # (see segmenters.py) picked from the start of the text by default:
+    # Chinese, Japanese and Thai, which are written without spaces, get a
+    # dictionary or phrase segmenter, and other non-ASCII text is broken at
+    # Unicode spaces and dashes.
+    # close() never waits for the indexing thread: it only cancels it, and
+    # the thread releases the buffer itself once it has stopped reading it.
+    # Indexing that stops early, cancelled or failed, still ends with
+    # complete set, so nothing waits for words that will never come, and
+    # with failed set when the index is short of the end of the text.
+    def __init__(self, filepath=None, chunk_size=CHUNK_SIZE, data=None, index=None, on_complete=None,
+                 workers=1, parallel_min_bytes=PARALLEL_MIN_BYTES, range_size=PARALLEL_RANGE_SIZE,
+                 segmenter="auto"):
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.range_size = range_size
+        self.on_complete = on_complete
+        self.index_buffer = None  # Mapping backing a prebuilt index, if any
+        self.chapter_names = {}  # Chapter titles by start word, from the text filters
+        # Filters the text went through (see text_filters.filter_key) and,
+        # for filtered text, the byte offset in the original book of each
+        # word, which is what reading positions are stored as
+        self.filter_key = "raw"
+        self.source_offsets = None
+        self.file = None
+        if data is None:
+            self.file = open(filepath, "rb")
+            try:
+                data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                data = b""
+        self.data = data
+        self.cancelled = False
+        self.failed = False
+        self.thread = None
+        self.lock = threading.Lock()  # Hands releasing the buffer from close() to the indexer
+        self.indexing = False
+        self.segmenter = None if segmenter == "auto" else segmenter
+        self.segment = None
+        if index is not None:
+            (self.offsets, self.lengths, self.flags,
+             self.sentence_starts, self.paragraph_starts, self.chapter_starts) = index
+            self.count = len(self.offsets)
+            self.complete = True
+            return
+        (self.offsets, self.lengths, self.flags,
+         self.sentence_starts, self.paragraph_starts, self.chapter_starts) = new_index(len(data) >= 1 << 32)
+        self.count = 0
+        self.complete = False
+        if segmenter == "auto":
+            self.segmenter = detect_segmenter(data)
+        self.segment = get_segmenter(self.segmenter)
+        self.pos = 3 if data[:3] == b"\xef\xbb\xbf" else 0
+        self.last_end = self.pos
+        self.index_chunk()
+        if not self.complete:
+            parallel = workers > 1 and filepath and len(data) >= parallel_min_bytes
+            target = self.index_parallel if parallel else self.index_rest
+            self.indexing = True
+            self.thread = threading.Thread(target=self.run_indexer, args=(target,), daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def from_bytes(cls, data, chunk_size=CHUNK_SIZE):
+        return cls(chunk_size=chunk_size, data=data)
+
+    def index_chunk(self):
+        data = self.data
+        size = len(data)
+        end = whitespace_after(data, min(size, self.pos + self.chunk_size))
+        self.last_end = self.scan(data, self.pos, end, self.arrays(), self.last_end, self.segment)
+        self.pos = end
+        self.count = len(self.offsets)
+        if end >= size:
+            self.finish()
+
+    def finish(self):
+        if self.flags:
+            self.flags[-1] |= SENTENCE_END | PARAGRAPH_END | CHAPTER_END
+        self.count = len(self.offsets)
+        self.complete = True
+        if self.on_complete:
+            self.on_complete(self)
+
+    @staticmethod
+    def scan(data, pos, end, index, last_end, segment=None):
+        # Appends the words in data[pos:end] to index and returns where the
+        # last one ends; last_end is the end of the word before pos
+        spans = map(re.Match.span, TOKEN_RE.finditer(data, pos, end))
+        # Text the segmenter would leave as it is skips it
+        if segment is not None and segment.pattern.search(data, pos, end):
+            spans = chain.from_iterable(starmap(partial(segment, data), spans))
+        offsets, lengths, flags, sentence_starts, paragraph_starts, chapter_starts = index
+        classify = TokenSource.classify
+        for start, stop in spans:
+            if flags:
+                if start - last_end > 1:
+                    flags[-1] |= gap_flags(data, last_end, start)
+                if flags[-1] & SENTENCE_END:
+                    sentence_starts.append(len(offsets))
+                if flags[-1] & PARAGRAPH_END:
+                    paragraph_starts.append(len(offsets))
+                    # Chapters start after a form feed or at a heading line
+                    if flags[-1] & CHAPTER_END or HEADING_RE.match(data, start):
+                        chapter_starts.append(len(offsets))
+            else:
+                sentence_starts.append(0)
+                paragraph_starts.append(0)
+                chapter_starts.append(0)
+            offsets.append(start)
+            lengths.append(stop - start)
+            flags.append(classify(data, start, stop))
+            last_end = stop
+        return last_end
+
+    def run_indexer(self, target):
+        try:
+            target()
+        finally:
+            if not self.complete:
+                # Cancelled, or a worker or the file failed: the book ends
+                # at the last word indexed, and is not written to the cache
+                self.failed = not self.cancelled
+                self.count = len(self.offsets)
+                self.complete = True
+            with self.lock:
+                self.indexing = False
+                if self.cancelled:
+                    self.release()
+
+    def index_parallel(self):
+        ranges = split_ranges(self.data, self.pos, self.range_size)
+        pool = ProcessPoolExecutor(max_workers=min(self.workers, len(ranges)))
+        try:
+            futures = [pool.submit(index_range, self.filepath, start, end, self.segmenter)
+                       for start, end in ranges]
+            # Merged in file order as each range completes, so the book
+            # stays readable from the start while later ranges are indexed
+            for future in futures:
+                while not self.cancelled:
+                    try:
+                        index = future.result(CANCEL_POLL)
+                        break
+                    except TimeoutError:
+                        continue
+                if self.cancelled:
+                    return
+                self.merge(index)
+            self.pos = len(self.data)
+            self.finish()
+        finally:
+            # Ranges not started yet are dropped; running ones finish in
+            # their processes without being waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def merge(self, index):
+        # Appends a range indexed on its own. Its first word was treated as
+        # the start of a text, so the sentence, paragraph and chapter starts
+        # at the seam are worked out again here.
+        offsets, lengths, flags, sentence_starts, paragraph_starts, chapter_starts = index
+        if not offsets:
+            return
+        base = len(self.offsets)
+        if base:
+            start = offsets[0]
+            if start - self.last_end > 1:
+                self.flags[-1] |= gap_flags(self.data, self.last_end, start)
+            if self.flags[-1] & SENTENCE_END:
+                self.sentence_starts.append(base)
+            if self.flags[-1] & PARAGRAPH_END:
+                self.paragraph_starts.append(base)
+                if self.flags[-1] & CHAPTER_END or HEADING_RE.match(self.data, start):
+                    self.chapter_starts.append(base)
+            sentence_starts, paragraph_starts, chapter_starts = (
+                array("I", [base + i for i in starts[1:]])
+                for starts in (sentence_starts, paragraph_starts, chapter_starts)
+            )
+        self.offsets.extend(offsets)
+        self.lengths.extend(lengths)
+        self.flags.extend(flags)
+        self.sentence_starts.extend(sentence_starts)
+        self.paragraph_starts.extend(paragraph_starts)
+        self.chapter_starts.extend(chapter_starts)
+        self.last_end = offsets[-1] + lengths[-1]
+        self.count = len(self.offsets)
+
+    @staticmethod
+    def classify(data, start, stop):
+        # Look past closing quotes and brackets for the final mark
+        while stop > start:
+            if data[stop - 1] in CLOSING_MARKS:
+                stop -= 1
+            elif stop - start >= 3 and data[stop - 3:stop] in CLOSING_QUOTES:
+                stop -= 3
+            else:
+                break
+        if stop == start:
+            return 0
+        last = data[stop - 1]
+        if last in SENTENCE_MARKS:
+            return SENTENCE_END | PUNCTUATION
+        if last in PAUSE_MARKS:
+            return PUNCTUATION
+        if last >= 0x80 and stop - start >= 3:
+            mark = data[stop - 3:stop]
+            if mark in WIDE_SENTENCE_MARKS:
+                return SENTENCE_END | PUNCTUATION
+            if mark in WIDE_PAUSE_MARKS:
+                return PUNCTUATION
+        return 0
+
+    def bounds(self, starts, i, limit=None):
+        # Word range [start, end) of the segment containing word i
+        n = bisect_right(starts, i)
+        start = starts[n - 1] if n else 0
+        end = starts[n] if n < len(starts) else self.count
+        if limit:
+            end = min(end, i + limit)
+        return start, end
+
+    def sentence_bounds(self, i):
+        return self.bounds(self.sentence_starts, i)
+
+    def paragraph_bounds(self, i, limit=None):
+        return self.bounds(self.paragraph_starts, i, limit)
+
+    def chapter_bounds(self, i):
+        return self.bounds(self.chapter_starts, i)
+
+    def chapter_number(self, i):
+        # Index into chapter_starts of the chapter containing word i
+        return max(0, bisect_right(self.chapter_starts, i) - 1)
+
+    def source_offset(self, i):
+        # Byte offset in the original book of word i. It does not change
+        # with the filters applied, so positions are saved in this form.
+        offsets = self.offsets if self.source_offsets is None else self.source_offsets
+        count = self.count if self.source_offsets is None else len(offsets)
+        return offsets[max(0, min(i, count - 1))] if count else 0
+
+    def source_index(self, offset):
+        # Index of the word at, or else just before, a byte offset in the
+        # original book; the inverse of source_offset. None while the offset
+        # lies beyond what has been indexed so far.
+        if self.source_offsets is not None:
+            return max(0, bisect_right(self.source_offsets, offset) - 1)
+        count = self.count
+        if not self.complete and (not count or offset > self.offsets[count - 1]):
+            return None
+        return max(0, bisect_right(self.offsets, offset, 0, count) - 1)
+
+    def words(self, start, end, source=None):
+        # Words start to end, such as the context of a search hit. Filtered
+        # text not indexed that far yet is read from the original book at
+        # source (a path) through the source offsets, which are all known
+        # up front; those words have not been through the filters.
+        offsets = self.source_offsets
+        if end <= self.count or self.complete or offsets is None or source is None:
+            return self[start:end]
+        end = min(end, len(offsets))
+        if start >= end:
+            return []
+        with open(source, "rb") as f:
+            f.seek(offsets[start])
+            data = f.read(offsets[end - 1] - offsets[start] + SOURCE_WORD_BYTES)
+        words = []
+        base = offsets[start]
+        for i in range(start, end):
+            first = offsets[i] - base
+            last = offsets[i + 1] - base if i + 1 < len(offsets) else len(data)
+            match = TOKEN_RE.match(data, first, max(first, last))
+            words.append(match.group().decode("utf-8", errors="replace") if match else "")
+        return words
+
+    def chapter_title(self, n):
+        # Title taken from an extracted heading, or else the first line of
+        # the chapter's heading paragraph, without decoration
+        start = self.chapter_starts[n]
+        if start in self.chapter_names:
+            return self.chapter_names[start]
+        end = min(self.paragraph_bounds(start)[1], start + TITLE_WORDS)
+        words = (word.strip(TITLE_STRIP) for word in self[start:end])
+        return " ".join(word for word in words if word)
+
+    def index_rest(self):
+        while not self.complete and not self.cancelled:
+            self.index_chunk()
+
+    def wait(self):
+        if self.thread:
+            self.thread.join()
+
+    def arrays(self):
+        return (self.offsets, self.lengths, self.flags, self.sentence_starts, self.paragraph_starts,
+                self.chapter_starts)
+
+    def close(self):
+        with self.lock:
+            self.cancelled = True
+            if self.indexing:
+                # Released by the indexing thread when it stops
+                return
+        self.release()
+
+    def release(self):
+        if self.index_buffer is not None:
+            # Views into the mapping must be released before it can close
+            for view in self.arrays():
+                view.release()
+            self.index_buffer.close()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self.file:
+            self.file.close()
+
+    def nbytes(self):
+        # Memory held by the index arrays, excluding the text buffer itself
+        return sum(a.itemsize * len(a) for a in self.arrays())
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("token index out of range")
+        start = self.offsets[i]
+        return self.data[start:start + self.lengths[i]].decode("utf-8", errors="replace")
+
+    def __iter__(self):
+        i = 0
+        while i < self.count or not self.complete:
+            if i < self.count:
+                yield self[i]
+                i += 1
+            elif self.thread:
+                self.thread.join(0.01)
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from book_cache import HEADER, MAGIC, BookCache
+from tokens import TOKENIZER_VERSION
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_bytes(b"One fish. Two fish.\n\nRed fish, blue fish.\n" * 200)
+    return str(path)
+
+
+def cached(cache, book):
+    tokens = cache.open(book, ())
+    tokens.wait()
+    arrays = [list(a) for a in tokens.arrays()]
+    tokens.close()
+    return cache.cache_path(cache.content_hash(book)), arrays
+
+
+def test_cached_index_round_trips(tmp_path, book):
+    cache = BookCache(str(tmp_path / "cache"))
+    path, arrays = cached(cache, book)
+    tokens = cache.read(book, path)
+    assert tokens is not None and tokens.complete
+    assert [list(a) for a in tokens.arrays()] == arrays
+    tokens.close()
+
+
+@pytest.mark.parametrize("field, value", [(0, b"NOTATOK\0"), (1, TOKENIZER_VERSION - 1)])
+def test_stale_or_foreign_cache_files_are_rejected(tmp_path, book, field, value):
+    cache = BookCache(str(tmp_path / "cache"))
+    path, _ = cached(cache, book)
+    with open(path, "r+b") as f:
+        header = list(HEADER.unpack(f.read(HEADER.size)))
+        assert header[0] == MAGIC
+        header[field] = value
+        f.seek(0)
+        f.write(HEADER.pack(*header))
+    assert cache.read(book, path) is None
+    # Removed, so the next open tokenizes the book and replaces it
+    assert not os.path.exists(path)
+
+
+def test_truncated_header_is_rejected(tmp_path, book):
+    cache = BookCache(str(tmp_path / "cache"))
+    path, _ = cached(cache, book)
+    with open(path, "r+b") as f:
+        f.truncate(HEADER.size - 1)
+    assert cache.read(book, path) is None
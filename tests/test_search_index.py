@@ -0,0 +1,12 @@
+from search_index import decode_positions, encode_positions
+
+
+def test_positions_round_trip():
+    for positions in ([], [0], [0, 1, 2], [127, 128, 16383, 16384, 16385], [5, 1 << 21, (1 << 35) + 7]):
+        assert decode_positions(encode_positions(positions)) == positions
+
+
+def test_small_gaps_take_one_byte():
+    positions = list(range(0, 127 * 1000, 127))
+    assert len(encode_positions(positions)) == len(positions)
+    assert len(encode_positions([128])) == 2
@@ -0,0 +1,43 @@
+import os
+
+from stats_store import StatsStore
+
+
+def session(words, minutes, book="a.txt", date="2024-01-01 10:00:00"):
+    return {"words_read": words, "time": minutes, "book": book, "date": date}
+
+
+def test_torn_journal_line_is_cut_off(tmp_path):
+    store = StatsStore(str(tmp_path))
+    store.load()
+    store.record(session(100, 1.0))
+    store.record(session(50, 0.5, book="b.txt"))
+    store.flush()
+    journal = store.journal_path
+    valid_size = os.path.getsize(journal)
+    with open(journal, "ab") as f:
+        f.write(b'{"words_read": 999, "time": 9')
+
+    store = StatsStore(str(tmp_path))
+    stats = store.load()
+    assert stats["total_words_read"] == 150
+    assert stats["books"]["b.txt"] == {"words_read": 50, "time": 0.5}
+    assert os.path.getsize(journal) == valid_size
+
+    # The next record starts on a clean line and survives a reload
+    store.record(session(25, 0.25))
+    store.flush()
+    stats = StatsStore(str(tmp_path)).load()
+    assert stats["total_words_read"] == 175
+    assert stats["books"]["a.txt"]["words_read"] == 125
+
+
+def test_compaction_does_not_count_records_twice(tmp_path):
+    store = StatsStore(str(tmp_path), compact_every=3)
+    store.load()
+    for _ in range(5):
+        store.record(session(10, 0.1))
+        store.flush()
+    stats = StatsStore(str(tmp_path)).load()
+    assert stats["total_words_read"] == 50
+    assert stats["days"]["2024-01-01"]["words_read"] == 50
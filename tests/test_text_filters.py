@@ -0,0 +1,74 @@
+import io
+from array import array
+
+from book_cache import BookCache
+from text_filters import DEFAULT_FILTERS, filter_book, filter_key
+from tokens import TokenSource
+
+SAMPLE = (b"The Project Gutenberg eBook of a Test\n\n"
+          b"*** START OF THE PROJECT GUTENBERG EBOOK A TEST ***\n\n"
+          b"TITLE: A Test\nAUTHOR: Nobody\n\n"
+          b"CHAPTER I.\nThe Beginning\n\n"
+          b"`Oh dear,' said the Rabbit, taking a watch out of its waist-\ncoat pocket.\n\n"
+          b"CHAPTER II.\n\n"
+          b"She said \"hello\" and left.\n\n"
+          b"*** END OF THE PROJECT GUTENBERG EBOOK A TEST ***\n\nLicence text here.\n")
+
+
+def filtered(data, names=DEFAULT_FILTERS):
+    tokens = TokenSource.from_bytes(data)
+    f = io.BytesIO()
+    offsets = array("I")
+    meta = filter_book(tokens, names, f, offsets)
+    return f.getvalue().decode("utf-8"), meta, offsets
+
+
+def test_filters_output():
+    text, meta, _ = filtered(SAMPLE)
+    assert text == ("‘Oh dear,’ said the Rabbit, taking a watch out of its waist-coat pocket.\n\n\f\n\n"
+                    "She said “hello” and left.")
+    assert meta["chapters"] == [(0, "CHAPTER I.: The Beginning"), (13, "CHAPTER II.")]
+    assert meta["metadata"] == {"title": "A Test", "author": "Nobody"}
+
+
+def test_without_filters_text_is_unchanged():
+    text, meta, offsets = filtered(SAMPLE, ())
+    assert text.split() == SAMPLE.decode("utf-8").split()
+    assert meta["chapters"] == []
+    assert len(offsets) == len(text.split())
+
+
+def test_offsets_point_at_source_words():
+    text, _, offsets = filtered(SAMPLE)
+    words = text.split()
+    assert len(words) == len(offsets)
+    for word, offset in zip(words, offsets):
+        source = SAMPLE[offset:].split()[0].decode("utf-8")
+        if word.isalpha():
+            assert source == word
+    # A word joined across a line break keeps the offset of its first half,
+    # and a normalized quote that of the word as written
+    assert SAMPLE[offsets[words.index("waist-coat")]:].startswith(b"waist-\ncoat")
+    assert SAMPLE[offsets[words.index("“hello”")]:].startswith(b"\"hello\"")
+
+
+def test_filtered_book_maps_words_to_source_offsets(tmp_path):
+    book = tmp_path / "book.txt"
+    book.write_bytes(SAMPLE)
+    cache = BookCache(str(tmp_path / "cache"))
+    tokens = cache.open(str(book), DEFAULT_FILTERS)
+    try:
+        tokens.wait()
+        assert tokens.filter_key == filter_key(DEFAULT_FILTERS)
+        assert tokens[0] == "‘Oh"
+        assert tokens.chapter_names == {0: "CHAPTER I.: The Beginning", 13: "CHAPTER II."}
+        i = list(tokens).index("Rabbit,")
+        offset = tokens.source_offset(i)
+        assert SAMPLE[offset:].startswith(b"Rabbit,")
+        assert tokens.source_index(offset) == i
+        # Bytes inside a word map back to it
+        assert tokens.source_index(offset + 3) == i
+        # The stripped header maps to the first word
+        assert tokens.source_index(0) == 0
+    finally:
+        tokens.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from tokens import TokenSource
+
+# Sentences, paragraphs and chapter headings, so range seams in the
+# parallel index land on every kind of boundary
+PARAGRAPH = (b"CHAPTER %d\n\nIt was a bright cold day in April, and the clocks were striking "
+             b"thirteen. \"Really?\" she asked; nobody answered.\n\n")
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_bytes(b"".join(PARAGRAPH % n for n in range(5000)))
+    return str(path)
+
+
+def test_parallel_index_matches_sequential(book):
+    sequential = TokenSource(book, chunk_size=4096)
+    sequential.wait()
+    parallel = TokenSource(book, chunk_size=4096, workers=3, parallel_min_bytes=0, range_size=64 << 10)
+    parallel.wait()
+    try:
+        assert not parallel.failed
+        assert len(parallel) == len(sequential) > 0
+        for ours, theirs in zip(parallel.arrays(), sequential.arrays()):
+            assert list(ours) == list(theirs)
+    finally:
+        sequential.close()
+        parallel.close()
+
+
+def test_close_cancels_indexing(book):
+    tokens = TokenSource(book, chunk_size=1024, workers=2, parallel_min_bytes=0, range_size=16 << 10)
+    tokens.close()
+    tokens.thread.join(10)
+    assert not tokens.thread.is_alive()
+    # Nothing waits for words that will never be indexed
+    assert tokens.complete and not tokens.failed
+
+
+def test_source_index_maps_offsets_to_words(book):
+    tokens = TokenSource(book, chunk_size=1024)
+    try:
+        tokens.wait()
+        start = tokens.offsets[100]
+        # Bytes inside a word and in the space after it belong to that word
+        assert tokens.source_index(start) == 100
+        assert tokens.source_index(start + tokens.lengths[100]) == 100
+        assert tokens.source_index(tokens.offsets[101]) == 101
+        assert tokens.source_index(1 << 40) == len(tokens) - 1
+        assert tokens.source_index(tokens.source_offset(2500)) == 2500
+    finally:
+        tokens.close()